@@ -0,0 +1,108 @@
+import threading
+import time
+from typing import Optional, Dict, Any, Iterable
+
+from flask import g, request, jsonify
+
+
+class AdmissionGate:
+    """Concurrency limit with a bounded wait queue for one class of routes"""
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait_seconds: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._admitted = 0
+        self._rejected_queue_full = 0
+        self._rejected_timeout = 0
+
+    def try_acquire(self) -> bool:
+        """Take a slot, waiting in the queue up to max_wait_seconds; False means shed the request"""
+        with self._condition:
+            if self._active < self.limit and self._waiting == 0:
+                self._active += 1
+                self._admitted += 1
+                return True
+            if self._waiting >= self.max_queue:
+                self._rejected_queue_full += 1
+                return False
+
+            self._waiting += 1
+            deadline = time.monotonic() + self.max_wait_seconds
+            try:
+                while self._active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._rejected_timeout += 1
+                        return False
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._active += 1
+            self._admitted += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                'limit': self.limit,
+                'max_queue': self.max_queue,
+                'active': self._active,
+                'queue_depth': self._waiting,
+                'admitted': self._admitted,
+                'rejected_queue_full': self._rejected_queue_full,
+                'rejected_timeout': self._rejected_timeout
+            }
+
+
+class AdmissionController:
+    """Sheds load with a fast 503 when a route class is saturated, instead of queueing on the Mongo pool"""
+
+    def __init__(self, gates: Dict[str, AdmissionGate], bulk_endpoints: Iterable[str] = (),
+                 exempt_endpoints: Iterable[str] = (), retry_after_seconds: int = 1):
+        self.gates = gates
+        self.bulk_endpoints = set(bulk_endpoints)
+        self.exempt_endpoints = set(exempt_endpoints)
+        self.retry_after_seconds = retry_after_seconds
+
+    def init_app(self, app):
+        app.before_request(self._admit)
+        app.teardown_request(self._release)
+
+    def classify(self, endpoint: Optional[str], method: str) -> Optional[str]:
+        """Route class for a request, or None when it bypasses admission control"""
+        if endpoint is None or endpoint in self.exempt_endpoints or method == 'OPTIONS':
+            return None
+        if endpoint in self.bulk_endpoints:
+            return 'bulk'
+        return 'read' if method in ('GET', 'HEAD') else 'write'
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: gate.stats() for name, gate in self.gates.items()}
+
+    def _admit(self):
+        route_class = self.classify(request.endpoint, request.method)
+        if route_class is None:
+            return None
+        gate = self.gates[route_class]
+        if not gate.try_acquire():
+            response = jsonify({'error': f"Server is overloaded ({route_class} requests), please retry"})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(self.retry_after_seconds)
+            return response
+        g.admission_gate = gate
+        return None
+
+    def _release(self, exc=None):
+        gate = g.pop('admission_gate', None)
+        if gate is not None:
+            gate.release()
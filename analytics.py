@@ -0,0 +1,212 @@
+import math
+import threading
+import time
+from typing import Optional, Dict, List, Any
+
+import numpy as np
+
+NUMERIC_ATTRIBUTES = {
+    'cost': 'Cost Price',
+    'selling': 'Selling Price',
+    'msrp': 'MSRP',
+    'stock': 'Stock Quantity',
+    'min_stock': 'Minimum Stock Level'
+}
+GROUP_ATTRIBUTES = {'brand': 'Brand', 'category': 'Category'}
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def _to_float(value) -> float:
+    if value is None or isinstance(value, bool):
+        return math.nan
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return math.nan
+
+
+def _clean(value) -> Optional[float]:
+    value = float(value)
+    return None if math.isnan(value) else round(value, 4)
+
+
+class CatalogColumns:
+    """Numeric attributes of every product as parallel NumPy arrays, with brand/category as integer codes"""
+
+    def __init__(self, products):
+        wanted = set(NUMERIC_ATTRIBUTES.values()) | set(GROUP_ATTRIBUTES.values()) | {'Product Name', 'SKU'}
+        values = {key: [] for key in NUMERIC_ATTRIBUTES}
+        codes = {key: [] for key in GROUP_ATTRIBUTES}
+        self.labels: Dict[str, List[str]] = {key: [] for key in GROUP_ATTRIBUTES}
+        lookups: Dict[str, Dict[str, int]] = {key: {} for key in GROUP_ATTRIBUTES}
+        self.ids, self.names, self.skus = [], [], []
+
+        projection = {'name': 1, 'sku': 1, 'stock_quantity': 1,
+                      'structure.attributes.name': 1, 'structure.attributes.value': 1}
+        for product in products.find({}, projection, batch_size=5000):
+            attrs = {}
+            for section in product.get('structure') or []:
+                for attr in section.get('attributes', []):
+                    if attr.get('name') in wanted:
+                        attrs.setdefault(attr['name'], attr.get('value'))
+
+            for key, name in NUMERIC_ATTRIBUTES.items():
+                values[key].append(_to_float(attrs.get(name)))
+            if product.get('stock_quantity') is not None:
+                values['stock'][-1] = float(product['stock_quantity'])
+            for key, name in GROUP_ATTRIBUTES.items():
+                label = attrs.get(name) or 'Unspecified'
+                code = lookups[key].get(label)
+                if code is None:
+                    code = lookups[key][label] = len(self.labels[key])
+                    self.labels[key].append(label)
+                codes[key].append(code)
+            self.ids.append(str(product['_id']))
+            self.names.append(attrs.get('Product Name') or product.get('name'))
+            self.skus.append(product.get('sku') or attrs.get('SKU'))
+
+        self.values = {key: np.array(column, dtype=np.float64) for key, column in values.items()}
+        self.codes = {key: np.array(column, dtype=np.int32) for key, column in codes.items()}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.values.values()) + sum(array.nbytes for array in self.codes.values())
+
+
+def margin_report(columns: CatalogColumns, group_by: str) -> Dict[str, Any]:
+    """Margin of Selling Price over Cost Price and discount against MSRP, grouped by brand or category"""
+    cost, selling, msrp = columns.values['cost'], columns.values['selling'], columns.values['msrp']
+    codes = columns.codes[group_by]
+    labels = columns.labels[group_by]
+
+    priced = np.isfinite(cost) & np.isfinite(selling) & (selling > 0)
+    margin = np.where(priced, selling - cost, 0.0)
+    margin_pct = np.where(priced, margin / np.where(priced, selling, 1.0), 0.0)
+    with_msrp = priced & np.isfinite(msrp) & (msrp > 0)
+    discount_pct = np.where(with_msrp, (msrp - selling) / np.where(with_msrp, msrp, 1.0), 0.0)
+
+    size = len(labels)
+    counts = np.bincount(codes, weights=priced, minlength=size)
+    margin_sum = np.bincount(codes, weights=margin, minlength=size)
+    margin_pct_sum = np.bincount(codes, weights=margin_pct, minlength=size)
+    msrp_counts = np.bincount(codes, weights=with_msrp, minlength=size)
+    discount_sum = np.bincount(codes, weights=discount_pct, minlength=size)
+    below_cost = np.bincount(codes, weights=priced & (selling < cost), minlength=size)
+
+    groups = []
+    for code, label in enumerate(labels):
+        if not counts[code]:
+            continue
+        groups.append({
+            group_by: label,
+            'priced_products': int(counts[code]),
+            'total_margin': _clean(margin_sum[code]),
+            'avg_margin_pct': _clean(margin_pct_sum[code] / counts[code] * 100),
+            'avg_discount_vs_msrp_pct': _clean(discount_sum[code] / msrp_counts[code] * 100) if msrp_counts[code] else None,
+            'selling_below_cost': int(below_cost[code])
+        })
+    groups.sort(key=lambda group: group['total_margin'] or 0, reverse=True)
+    return {
+        'group_by': group_by,
+        'priced_products': int(priced.sum()),
+        'avg_margin_pct': _clean(margin_pct[priced].mean() * 100) if priced.any() else None,
+        'groups': groups
+    }
+
+
+def low_stock_report(columns: CatalogColumns, group_by: str, limit: int = 100) -> Dict[str, Any]:
+    """Products whose Stock Quantity is below their Minimum Stock Level, worst shortfall first"""
+    stock, min_stock = columns.values['stock'], columns.values['min_stock']
+    low = np.isfinite(stock) & np.isfinite(min_stock) & (stock < min_stock)
+    shortfall = np.where(low, min_stock - stock, 0.0)
+    worst = np.flatnonzero(low)
+    worst = worst[np.argsort(-shortfall[worst], kind='stable')][:limit]
+
+    codes = columns.codes[group_by]
+    per_group = np.bincount(codes, weights=low, minlength=len(columns.labels[group_by]))
+    return {
+        'group_by': group_by,
+        'low_stock_products': int(low.sum()),
+        'groups': [{group_by: label, 'low_stock_products': int(per_group[code])}
+                   for code, label in enumerate(columns.labels[group_by]) if per_group[code]],
+        'products': [{
+            '_id': columns.ids[i],
+            'name': columns.names[i],
+            'sku': columns.skus[i],
+            'stock_quantity': _clean(stock[i]),
+            'minimum_stock_level': _clean(min_stock[i]),
+            'shortfall': _clean(shortfall[i])
+        } for i in worst]
+    }
+
+
+def _distribution(prices: np.ndarray) -> Dict[str, Any]:
+    return {
+        'count': int(prices.size),
+        'min': _clean(prices.min()),
+        'max': _clean(prices.max()),
+        'mean': _clean(prices.mean()),
+        'percentiles': {f"p{p}": _clean(value) for p, value in zip(PERCENTILES, np.percentile(prices, PERCENTILES))}
+    }
+
+
+def price_distribution_report(columns: CatalogColumns, group_by: Optional[str] = None, bins: int = 10) -> Dict[str, Any]:
+    """Histogram and percentiles of Selling Price, overall and optionally per brand or category"""
+    selling = columns.values['selling']
+    priced = np.isfinite(selling)
+    prices = selling[priced]
+    if not prices.size:
+        return {'count': 0, 'histogram': [], 'groups': []}
+
+    counts, edges = np.histogram(prices, bins=bins)
+    report = _distribution(prices)
+    report['histogram'] = [{'from': _clean(edges[i]), 'to': _clean(edges[i + 1]), 'count': int(counts[i])}
+                           for i in range(len(counts))]
+
+    if group_by:
+        # Sort by (group, price) once, then split into contiguous per-group runs
+        codes = columns.codes[group_by][priced]
+        order = np.lexsort((prices, codes))
+        sorted_codes, sorted_prices = codes[order], prices[order]
+        boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+        report['group_by'] = group_by
+        report['groups'] = [
+            dict(_distribution(run), **{group_by: columns.labels[group_by][int(sorted_codes[start])]})
+            for start, run in zip(np.concatenate(([0], boundaries)), np.split(sorted_prices, boundaries))
+        ]
+    return report
+
+
+class AnalyticsCache:
+    """Keeps CatalogColumns between requests and rebuilds them only when the catalog has changed"""
+
+    def __init__(self, products, check_interval_seconds: float = 10.0):
+        self.products = products
+        self.check_interval_seconds = check_interval_seconds
+        self._lock = threading.Lock()
+        self._columns: Optional[CatalogColumns] = None
+        self._fingerprint = None
+        self._checked_at = 0.0
+
+    def columns(self) -> CatalogColumns:
+        with self._lock:
+            now = time.monotonic()
+            if self._columns is not None and now - self._checked_at < self.check_interval_seconds:
+                return self._columns
+            fingerprint = self._catalog_fingerprint()
+            if self._columns is None or fingerprint != self._fingerprint:
+                self._columns = CatalogColumns(self.products)
+                self._fingerprint = fingerprint
+            self._checked_at = now
+            return self._columns
+
+    def stats(self) -> Dict[str, Any]:
+        columns = self._columns
+        return {'products': len(columns) if columns else 0, 'array_bytes': columns.nbytes() if columns else 0}
+
+    def _catalog_fingerprint(self):
+        # Creates and updates move the newest updated_at; deletes change the count
+        latest = next(self.products.find({}, {'updated_at': 1}).sort('updated_at', -1).limit(1), None)
+        return self.products.estimated_document_count(), latest.get('updated_at') if latest else None
@@ -1,10 +1,30 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
 from bson import ObjectId
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+from admission import AdmissionController, AdmissionGate
+from analytics import (GROUP_ATTRIBUTES, AnalyticsCache, low_stock_report, margin_report,
+                       price_distribution_report)
+from autocomplete import PrefixIndex
+from circuit_breaker import CircuitBreaker, LastKnownGood, is_database_unavailable, mongo_timeout_options
+from dedupe import (DEFAULT_THRESHOLD, backfill_signatures, find_duplicate_clusters, find_duplicates,
+                    signature_fields)
+from inventory import (MAX_EVENTS_PER_BATCH, apply_stock_deltas, backfill_indexed_fields, coalesce_stock_events,
+                       indexed_fields)
+from jobs import JobRunner, JOB_STATUSES
+from profiling import RequestProfiler
+from singleflight import SingleFlight
+from read_model import ReadModel
+from render import compile_merge_plan, render_product
+from sync import CheckpointExpired, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, DEFAULT_RETENTION_DAYS, get_changes, record_tombstone
+from migrations import (TemplateMigrator, backfill_typed_values, compute_template_diff, diff_is_empty,
+                        strip_picklist_options)
+from template_cache import TemplateCache
+from utils import (INTERNAL_FIELDS_PROJECTION, SkuAllocator, coerce_structure_values, present_structure_values,
+                   without_picklist_options, with_picklist_options)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,12 +34,157 @@ CORS(app)  # Enable Cross-Origin Resource Sharing
 
 # MongoDB connection setup
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
-client = MongoClient(MONGO_URI)
+# Short connect/selection timeouts: with Mongo down a request should fail in seconds, not hold a worker for 30s
+client = MongoClient(MONGO_URI, **mongo_timeout_options())
 db = client.product_management  # Access 'product_management' database
 
+# Background jobs get their own client: long chunks are bounded per operation by a socket timeout,
+# and their errors never reach error_response, so they cannot trip the request circuit breaker
+job_client = MongoClient(MONGO_URI, **mongo_timeout_options(int(os.getenv('JOB_SOCKET_TIMEOUT_MS', '300000'))))
+job_products_collection = job_client.product_management.products
+
 # Define MongoDB collections
 products_collection = db.products
 view_templates_collection = db.view_templates
+template_migrations_collection = db.template_migrations
+jobs_collection = db.jobs
+counters_collection = db.counters
+tombstones_collection = db.tombstones
+TOMBSTONE_RETENTION_DAYS = int(os.getenv('TOMBSTONE_RETENTION_DAYS', str(DEFAULT_RETENTION_DAYS)))
+
+# SKUs are minted from blocks reserved in the counters collection, so they never collide
+sku_allocator = SkuAllocator(counters_collection, block_size=int(os.getenv('SKU_BLOCK_SIZE', '1000')))
+
+# Background job runner so heavy catalog operations never run on the request path
+job_runner = JobRunner(
+    jobs_collection,
+    max_workers=int(os.getenv('JOB_MAX_WORKERS', '4')),
+    stale_after_seconds=int(os.getenv('JOB_STALE_SECONDS', '300'))
+)
+
+# Background migration of existing products when a view template changes
+template_migrator = TemplateMigrator(
+    job_products_collection,
+    template_migrations_collection,
+    chunk_size=int(os.getenv('MIGRATION_CHUNK_SIZE', '500')),
+    throttle_seconds=float(os.getenv('MIGRATION_THROTTLE_SECONDS', '0.05'))
+)
+
+def run_template_migration(job):
+    migration = template_migrator.get(ObjectId(job.params['migration_id']))
+    if not migration:
+        raise ValueError(f"Migration {job.params['migration_id']} not found")
+    return template_migrator.run_pending(migration['template_id'], job)
+
+# Migrations of the same template must apply in order, so they run one at a time
+job_runner.register('template_migration', run_template_migration, concurrency=1, resumable=True)
+
+def run_strip_picklist_options(job):
+    return strip_picklist_options(job_products_collection, job,
+                                  chunk_size=template_migrator.chunk_size,
+                                  throttle_seconds=template_migrator.throttle_seconds)
+
+job_runner.register('strip_picklist_options', run_strip_picklist_options, concurrency=1, resumable=True)
+
+def run_dedupe_signatures(job):
+    return backfill_signatures(job_products_collection, job, chunk_size=template_migrator.chunk_size)
+
+job_runner.register('dedupe_signatures', run_dedupe_signatures, concurrency=1, resumable=True)
+
+# Sets sku/stock_quantity on products created before those top-level fields existed
+def run_indexed_fields_backfill(job):
+    return backfill_indexed_fields(job_products_collection, job, chunk_size=template_migrator.chunk_size)
+
+job_runner.register('indexed_fields', run_indexed_fields_backfill, concurrency=1, resumable=True)
+
+# Converts string-stored Number/Boolean/Date values of existing products (params: optional template_id)
+def run_typed_values_backfill(job):
+    query = {'_id': ObjectId(job.params['template_id'])} if job.params.get('template_id') else {}
+    return backfill_typed_values(job_products_collection, list(view_templates_collection.find(query)), job,
+                                 chunk_size=template_migrator.chunk_size,
+                                 throttle_seconds=template_migrator.throttle_seconds)
+
+job_runner.register('typed_values', run_typed_values_backfill, concurrency=1, resumable=True)
+
+# Opt-in request profiling (X-Profile-Token header matching PROFILE_TOKEN, or PROFILE_SAMPLE_RATE).
+# Registered first so a profile covers the other request hooks; with neither set no hooks are added.
+request_profiler = None
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+if PROFILE_TOKEN or PROFILE_SAMPLE_RATE > 0:
+    request_profiler = RequestProfiler(
+        os.getenv('PROFILE_DIR', 'profiles'),
+        token=PROFILE_TOKEN,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        keep=int(os.getenv('PROFILE_KEEP', '20'))
+    )
+    request_profiler.init_app(app)
+
+# Routes that scan or write large parts of the catalog: own admission gate and a longer DB budget
+BULK_ENDPOINTS = {'get_products', 'render_products', 'get_catalog_changes', 'adjust_stock',
+                  'generate_skus', 'submit_job', 'get_duplicate_clusters', 'get_margin_report',
+                  'get_low_stock_report', 'get_price_distribution_report'}
+
+# Circuit breaker: after repeated outage errors, fail fast with 503 until a ping shows Mongo is back.
+# Registered before admission control so fast-failed requests never take an admission slot.
+db_breaker = CircuitBreaker(
+    probe=lambda: db.command('ping'),
+    failure_threshold=int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5')),
+    reset_timeout_seconds=float(os.getenv('CIRCUIT_RESET_SECONDS', '10')),
+    exempt_endpoints={'health_check', 'get_metrics'},
+    fallback_endpoints={'get_view_templates', 'get_view_template'},
+    bulk_endpoints=BULK_ENDPOINTS,
+    request_timeout_seconds=float(os.getenv('REQUEST_DB_TIMEOUT_SECONDS', '5')),
+    bulk_timeout_seconds=float(os.getenv('BULK_DB_TIMEOUT_SECONDS', '60'))
+)
+db_breaker.init_app(app)
+
+# Last successful template responses, served while the circuit is open
+last_known_templates = LastKnownGood()
+
+def error_response(e):
+    """503 (counted by the circuit breaker) when Mongo is unreachable or timing out, otherwise 500"""
+    if db_breaker.counts_as_outage(e):
+        db_breaker.record_failure(e)
+        return db_breaker.unavailable_response()
+    if is_database_unavailable(e):
+        # A bulk route outran its time budget against a reachable server
+        return jsonify({'error': f"Operation timed out: {e}"}), 504
+    return jsonify({'error': str(e)}), 500
+
+# Admission control: per-route-class concurrency limits with a bounded wait queue, so spikes
+# get a fast 503 + Retry-After instead of every request stalling on the MongoClient pool
+def admission_gate(route_class, limit, max_queue):
+    return AdmissionGate(
+        route_class,
+        limit=int(os.getenv(f'ADMISSION_{route_class.upper()}_LIMIT', str(limit))),
+        max_queue=int(os.getenv(f'ADMISSION_{route_class.upper()}_QUEUE', str(max_queue))),
+        max_wait_seconds=float(os.getenv('ADMISSION_MAX_WAIT_SECONDS', '2'))
+    )
+
+admission = AdmissionController(
+    {
+        'read': admission_gate('read', 32, 64),
+        'write': admission_gate('write', 16, 32),
+        'bulk': admission_gate('bulk', 4, 8)
+    },
+    bulk_endpoints=BULK_ENDPOINTS,
+    exempt_endpoints={'health_check', 'get_metrics'},
+    retry_after_seconds=int(os.getenv('ADMISSION_RETRY_AFTER', '1'))
+)
+admission.init_app(app)
+
+# In-memory prefix index for product name/SKU typeahead, kept current by the product write routes;
+# it is built off the request path, on the job client
+autocomplete_index = PrefixIndex(job_products_collection,
+                                 rebuild_after_seconds=float(os.getenv('AUTOCOMPLETE_REBUILD_SECONDS', '300')))
+
+# Columnar NumPy copy of numeric product attributes for pricing/inventory reports
+analytics_cache = AnalyticsCache(products_collection,
+                                 check_interval_seconds=float(os.getenv('ANALYTICS_CHECK_SECONDS', '10')))
+
+# Concurrent identical GETs share one backend fetch and one serialized response body
+single_flight = SingleFlight()
 
 # Helper function to convert ObjectId to string for JSON serialization
 def serialize_doc(doc):
@@ -30,54 +195,171 @@ def serialize_doc(doc):
 def serialize_docs(docs):
     return [serialize_doc(doc) for doc in docs]
 
+# Cached view templates, used to resolve picklist options that products no longer embed
+template_cache = TemplateCache(view_templates_collection, ttl_seconds=float(os.getenv('TEMPLATE_CACHE_TTL', '30')))
+
+def include_options_requested():
+    return request.args.get('include_options', 'true').lower() not in ('false', '0', 'no')
+
+def hydrate_product(product):
+    if product and product.get('structure'):
+        options = template_cache.picklist_options(template_cache.for_product(product))
+        product['structure'] = with_picklist_options(product['structure'], options)
+    return product
+
+def legacy_values_requested():
+    # ?value_format=string keeps numbers as strings for clients written before values were typed
+    return request.args.get('value_format', '').lower() == 'string'
+
+def format_product_values(product, legacy=False):
+    if product and product.get('structure'):
+        product['structure'] = present_structure_values(product['structure'], legacy)
+    return product
+
+def coerce_product_values(data, template):
+    """Store attribute values as native BSON types (numbers, booleans, dates) per the owning template"""
+    data['structure'] = coerce_structure_values(data['structure'], template_cache.attribute_types(template))
+    return data
+
+def set_indexed_fields(data):
+    """Mirror SKU and Stock Quantity from structure into top-level indexed/typed fields"""
+    data.update(indexed_fields(data['structure']))
+    return data
+
+# Optional read model: each worker serves GETs from an in-memory, pre-serialized catalog snapshot
+def serialize_product_bytes(product):
+    return app.json.dumps(serialize_doc(format_product_values(hydrate_product(product)))).encode()
+
+def serialize_template_bytes(template):
+    return app.json.dumps(serialize_doc(template)).encode()
+
+read_model = None
+if os.getenv('READ_MODEL_ENABLED', 'false').lower() in ('true', '1', 'yes'):
+    read_model = ReadModel(
+        products_collection,
+        view_templates_collection,
+        tombstones_collection,
+        serialize_product=serialize_product_bytes,
+        serialize_template=serialize_template_bytes,
+        projection=INTERNAL_FIELDS_PROJECTION,
+        refresh_interval_seconds=float(os.getenv('READ_MODEL_REFRESH_SECONDS', '5')),
+        max_staleness_seconds=float(os.getenv('READ_MODEL_MAX_STALENESS_SECONDS', '30')),
+        # Another worker's template write never reaches this worker's cache, so drop it before rebuilding
+        on_templates_changed=template_cache.invalidate
+    )
+
+def read_model_snapshot(products=False):
+    """Snapshot to answer from, or None to read from Mongo"""
+    if read_model is None or (products and (not include_options_requested() or legacy_values_requested())):
+        return None
+    return read_model.snapshot()
+
+def json_bytes_response(body):
+    return app.response_class(body, mimetype='application/json')
+
+def remembered_template_response(key, doc):
+    body = app.json.dumps(doc).encode()
+    last_known_templates.remember(key, body)
+    return json_bytes_response(body)
+
+def last_known_template_response(key):
+    body = last_known_templates.get(key)
+    if body is None:
+        return db_breaker.unavailable_response()
+    response = json_bytes_response(body)
+    response.headers['X-Served-From'] = 'last-known-good'
+    return response
+
 # ---------------------------- Product Routes ----------------------------
 
 # Get all products
 @app.route('/productManagement/get-products', methods=['GET'])
+@single_flight.coalesce
 def get_products():
     try:
-        products = list(products_collection.find())
+        snapshot = read_model_snapshot(products=True)
+        if snapshot:
+            return json_bytes_response(snapshot.products_json)
+        products = list(products_collection.find({}, INTERNAL_FIELDS_PROJECTION))
+        if include_options_requested():
+            products = [hydrate_product(product) for product in products]
+        legacy = legacy_values_requested()
+        products = [format_product_values(product, legacy) for product in products]
         return jsonify(serialize_docs(products))
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 # Get a single product by ID
 @app.route('/productManagement/products/<product_id>', methods=['GET'])
+@single_flight.coalesce
 def get_product(product_id):
     try:
-        product = products_collection.find_one({'_id': ObjectId(product_id)})
+        snapshot = read_model_snapshot(products=True)
+        if snapshot and product_id in snapshot.products:
+            return json_bytes_response(snapshot.products[product_id])
+        product = products_collection.find_one({'_id': ObjectId(product_id)}, INTERNAL_FIELDS_PROJECTION)
         if not product:
             return jsonify({'error': 'Product not found'}), 404
-        return jsonify(serialize_doc(product))
+        if include_options_requested():
+            product = hydrate_product(product)
+        return jsonify(serialize_doc(format_product_values(product, legacy_values_requested())))
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 # Create a new product
 @app.route('/productManagement/create-product', methods=['POST'])
 def create_product():
     try:
         data = request.get_json()
+        if 'structure' in data:
+            data['structure'] = without_picklist_options(data['structure'])
+            coerce_product_values(data, template_cache.for_product(data))
+            set_indexed_fields(data)
+        # Signatures let the create (and later imports) find near-duplicates without a catalog scan
+        data.update(signature_fields(data))
+        possible_duplicates = find_duplicates(products_collection, data)
         data['created_at'] = datetime.utcnow()
         data['updated_at'] = datetime.utcnow()
         result = products_collection.insert_one(data)
+        autocomplete_index.upsert(data)
         # product = products_collection.find_one({'_id': result.inserted_id})
-        return jsonify({'Success': "Product is Created Successfully"}), 201
+        response = {'Success': "Product is Created Successfully"}
+        if possible_duplicates:
+            response['possible_duplicates'] = possible_duplicates
+        return jsonify(response), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 # Update an existing product by ID (converted to POST)
 @app.route('/productManagement/update-product/<product_id>', methods=['POST'])
 def update_product(product_id):
     try:
         data = request.get_json()
+        if 'structure' in data:
+            owner = data
+            if 'view_template_id' not in data:
+                owner = products_collection.find_one({'_id': ObjectId(product_id)}, {'view_template_id': 1})
+                if not owner:
+                    return jsonify({'error': 'Product not found'}), 404
+            data['structure'] = without_picklist_options(data['structure'])
+            coerce_product_values(data, template_cache.for_product(owner))
+            set_indexed_fields(data)
+            data.update(signature_fields(data))
         data['updated_at'] = datetime.utcnow()
         result = products_collection.update_one({'_id': ObjectId(product_id)}, {'$set': data})
         if result.matched_count == 0:
             return jsonify({'error': 'Product not found'}), 404
-        product = products_collection.find_one({'_id': ObjectId(product_id)})
-        return jsonify(serialize_doc(product))
+        product = products_collection.find_one({'_id': ObjectId(product_id)}, INTERNAL_FIELDS_PROJECTION)
+        autocomplete_index.upsert(product)
+        if include_options_requested():
+            product = hydrate_product(product)
+        return jsonify(serialize_doc(format_product_values(product, legacy_values_requested())))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 # Delete a product by ID (converted to POST)
 @app.route('/productManagement/delete-product/<product_id>', methods=['POST'])
@@ -86,31 +368,192 @@ def delete_product(product_id):
         result = products_collection.delete_one({'_id': ObjectId(product_id)})
         if result.deleted_count == 0:
             return jsonify({'error': 'Product not found'}), 404
+        record_tombstone(tombstones_collection, 'products', product_id)
+        autocomplete_index.remove(product_id)
         return jsonify({'message': 'Product deleted successfully'})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
+
+# Generate one or more unique SKUs for new products
+@app.route('/productManagement/generate-skus', methods=['POST'])
+def generate_skus():
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            count = int(data.get('count', 1))
+        except (ValueError, TypeError):
+            return jsonify({'error': 'count must be an integer'}), 400
+        if count < 1 or count > 10000:
+            return jsonify({'error': 'count must be between 1 and 10000'}), 400
+        return jsonify({'skus': sku_allocator.allocate(count)})
+    except Exception as e:
+        return error_response(e)
+
+def get_merge_plan(template_id):
+    """Return (template, compiled merge plan) for a template id, or the default template when none is given"""
+    template = template_cache.find(template_id) if template_id else template_cache.default()
+    if not template:
+        return None, None
+    return template, template_cache.derived(template, 'merge_plan', compile_merge_plan)
+
+# Typeahead: ranked products whose name, SKU or a word of the name starts with ?q=
+@app.route('/productManagement/autocomplete', methods=['GET'])
+def autocomplete_products():
+    try:
+        query = request.args.get('q', '')
+        if not query.strip():
+            return jsonify({'results': []})
+        limit = min(int(request.args.get('limit', 10)), 50)
+        if not autocomplete_index.ensure_fresh():
+            response = jsonify({'error': 'Autocomplete index is still building, please retry'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '1'
+            return response
+        return jsonify({'results': autocomplete_index.search(query, limit)})
+    except Exception as e:
+        return error_response(e)
+
+# Find likely duplicates of a product (existing via ?product_id=, or submitted in the body)
+@app.route('/productManagement/products/find-duplicates', methods=['POST'])
+def find_product_duplicates():
+    try:
+        threshold = float(request.args.get('threshold', DEFAULT_THRESHOLD))
+        exclude_id = None
+        if request.args.get('product_id'):
+            exclude_id = ObjectId(request.args['product_id'])
+            product = products_collection.find_one({'_id': exclude_id}, {'name': 1, 'structure': 1})
+            if not product:
+                return jsonify({'error': 'Product not found'}), 404
+        else:
+            product = request.get_json(silent=True) or {}
+        duplicates = find_duplicates(products_collection, signature_fields(product),
+                                     exclude_id=exclude_id, threshold=threshold)
+        return jsonify({'duplicates': duplicates})
+    except Exception as e:
+        return error_response(e)
+
+# List clusters of likely duplicate products across the whole catalog
+@app.route('/productManagement/duplicate-clusters', methods=['GET'])
+def get_duplicate_clusters():
+    try:
+        threshold = float(request.args.get('threshold', DEFAULT_THRESHOLD))
+        result = find_duplicate_clusters(products_collection, threshold=threshold)
+        return jsonify({'clusters': result['clusters'], 'count': len(result['clusters']),
+                        'truncated': result['truncated']})
+    except Exception as e:
+        return error_response(e)
+
+# Get products created, updated or deleted since a checkpoint token
+@app.route('/productManagement/changes', methods=['GET'])
+def get_catalog_changes():
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        changes = get_changes(products_collection, tombstones_collection, request.args.get('since'),
+                              limit=limit, retention_days=TOMBSTONE_RETENTION_DAYS,
+                              projection=INTERNAL_FIELDS_PROJECTION)
+        if include_options_requested():
+            changes['products'] = [hydrate_product(product) for product in changes['products']]
+        legacy = legacy_values_requested()
+        changes['products'] = serialize_docs([format_product_values(product, legacy) for product in changes['products']])
+        return jsonify(changes)
+    except CheckpointExpired as e:
+        return jsonify({'error': str(e)}), 410
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return error_response(e)
+
+# Get a single product shaped by a view template
+@app.route('/productManagement/products/<product_id>/render', methods=['GET'])
+def render_single_product(product_id):
+    try:
+        template, plan = get_merge_plan(request.args.get('view_template_id'))
+        if not template:
+            return jsonify({'error': 'Template not found'}), 404
+        product = products_collection.find_one({'_id': ObjectId(product_id)}, {'name': 1, 'structure': 1})
+        if not product:
+            return jsonify({'error': 'Product not found'}), 404
+        rendered = render_product(plan, format_product_values(product, legacy_values_requested()))
+        rendered['view_template_id'] = str(template['_id'])
+        return jsonify(rendered)
+    except Exception as e:
+        return error_response(e)
+
+# Get many products shaped by a view template (all products, or those listed in ?ids=a,b,c)
+@app.route('/productManagement/render-products', methods=['GET'])
+def render_products():
+    try:
+        template, plan = get_merge_plan(request.args.get('view_template_id'))
+        if not template:
+            return jsonify({'error': 'Template not found'}), 404
+        query = {}
+        if request.args.get('ids'):
+            query['_id'] = {'$in': [ObjectId(product_id) for product_id in request.args['ids'].split(',')]}
+        cursor = products_collection.find(query, {'name': 1, 'structure': 1}).sort('_id', 1)
+        if request.args.get('skip'):
+            cursor = cursor.skip(int(request.args['skip']))
+        if request.args.get('limit'):
+            cursor = cursor.limit(int(request.args['limit']))
+        legacy = legacy_values_requested()
+        return jsonify({
+            'view_template_id': str(template['_id']),
+            'products': [render_product(plan, format_product_values(product, legacy)) for product in cursor]
+        })
+    except Exception as e:
+        return error_response(e)
+
+# ------------------------ Inventory Routes ------------------------
+
+# Apply a batch of stock deltas (e.g. from order events) atomically per SKU
+@app.route('/productManagement/inventory/adjust-stock', methods=['POST'])
+def adjust_stock():
+    try:
+        data = request.get_json(silent=True) or {}
+        events = data.get('events')
+        if not isinstance(events, list) or not events:
+            return jsonify({'error': 'events must be a non-empty list'}), 400
+        if len(events) > MAX_EVENTS_PER_BATCH:
+            return jsonify({'error': f"A batch may contain at most {MAX_EVENTS_PER_BATCH} events"}), 400
+        deltas, errors = coalesce_stock_events(events)
+        if errors:
+            return jsonify({'errors': errors}), 400
+        return jsonify(apply_stock_deltas(products_collection, deltas))
+    except Exception as e:
+        return error_response(e)
 
 # ------------------------ View Template Routes ------------------------
 
 # Get all view templates
 @app.route('/productManagement/view-templates', methods=['GET'])
+@single_flight.coalesce
 def get_view_templates():
     try:
+        snapshot = read_model_snapshot()
+        if snapshot:
+            return json_bytes_response(snapshot.templates_json)
+        if db_breaker.request_rejected():
+            return last_known_template_response('all')
         templates = list(view_templates_collection.find())
-        return jsonify(serialize_docs(templates))
+        return remembered_template_response('all', serialize_docs(templates))
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 # Get a single view template by ID
 @app.route('/productManagement/view-template/<template_id>', methods=['GET'])
+@single_flight.coalesce
 def get_view_template(template_id):
     try:
+        snapshot = read_model_snapshot()
+        if snapshot and template_id in snapshot.templates:
+            return json_bytes_response(snapshot.templates[template_id])
+        if db_breaker.request_rejected():
+            return last_known_template_response(template_id)
         template = view_templates_collection.find_one({'_id': ObjectId(template_id)})
         if not template:
             return jsonify({'error': 'Template not found'}), 404
-        return jsonify(serialize_doc(template))
+        return remembered_template_response(template_id, serialize_doc(template))
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 # Create a new view template
 @app.route('/productManagement/create-view', methods=['POST'])
@@ -123,7 +566,7 @@ def create_view_template():
         template = view_templates_collection.find_one({'_id': result.inserted_id})
         return jsonify(serialize_doc(template)), 201
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 # Update an existing view template (converted to POST)
 @app.route('/productManagement/update-view/<template_id>', methods=['POST'])
@@ -131,13 +574,37 @@ def update_view_template(template_id):
     try:
         data = request.get_json()
         data['last_modified'] = datetime.utcnow().strftime('%Y-%m-%d')
-        result = view_templates_collection.update_one({'_id': ObjectId(template_id)}, {'$set': data})
-        if result.matched_count == 0:
+        data.pop('revision', None)
+        # Read the pre-image atomically with the write, so concurrent updates each diff against their own base;
+        # the revision counter orders their migrations
+        old_template = view_templates_collection.find_one_and_update(
+            {'_id': ObjectId(template_id)}, {'$set': data, '$inc': {'revision': 1}},
+            return_document=ReturnDocument.BEFORE)
+        if not old_template:
             return jsonify({'error': 'Template not found'}), 404
-        template = view_templates_collection.find_one({'_id': ObjectId(template_id)})
-        return jsonify(serialize_doc(template))
+        template = dict(old_template, **data, revision=old_template.get('revision', 0) + 1)
+        template_cache.invalidate(template_id)
+        last_known_templates.forget(template_id)
+        last_known_templates.forget('all')
+
+        # Queue a background migration so existing products follow renamed/removed/retyped attributes
+        migration_id = None
+        diff = compute_template_diff(old_template, template)
+        if not diff_is_empty(diff):
+            migration_id = template_migrator.create(template_id, diff, bool(template.get('is_default')),
+                                                    template['revision'])
+            job_id = job_runner.submit('template_migration', {'migration_id': str(migration_id)})
+            # Unless a job already draining this template's migrations has claimed it
+            template_migrations_collection.update_one({'_id': migration_id, 'status': 'pending'},
+                                                      {'$set': {'job_id': job_id}})
+
+        response = serialize_doc(template)
+        if migration_id:
+            response['migration_id'] = str(migration_id)
+            response['job_id'] = str(job_id)
+        return jsonify(response)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 # Delete a view template (converted to POST)
 @app.route('/productManagement/delete-view/<template_id>', methods=['POST'])
@@ -149,9 +616,169 @@ def delete_view_template(template_id):
         result = view_templates_collection.delete_one({'_id': ObjectId(template_id)})
         if result.deleted_count == 0:
             return jsonify({'error': 'Template not found'}), 404
+        template_cache.invalidate(template_id)
+        last_known_templates.forget(template_id)
+        last_known_templates.forget('all')
         return jsonify({'message': 'Template deleted successfully'})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
+
+# ------------------------ Template Migration Routes ------------------------
+
+# Get progress of a template migration
+@app.route('/productManagement/template-migrations/<migration_id>', methods=['GET'])
+def get_template_migration(migration_id):
+    try:
+        migration = template_migrator.get(ObjectId(migration_id))
+        if not migration:
+            return jsonify({'error': 'Migration not found'}), 404
+        migration['last_id'] = str(migration['last_id']) if migration.get('last_id') else None
+        migration['job_id'] = str(migration['job_id']) if migration.get('job_id') else None
+        return jsonify(serialize_doc(migration))
+    except Exception as e:
+        return error_response(e)
+
+# Resume a failed or interrupted template migration from its last checkpoint
+@app.route('/productManagement/template-migrations/<migration_id>/resume', methods=['POST'])
+def resume_template_migration(migration_id):
+    try:
+        migration = template_migrator.get(ObjectId(migration_id))
+        if not migration:
+            return jsonify({'error': 'Migration not found'}), 404
+        # Migrations of a template apply in order, so an older unfinished one has to be resumed first
+        blocker = template_migrator.blocking_migration(migration)
+        if blocker:
+            return jsonify({'error': f"Migration {blocker['_id']} of this template has not completed",
+                            'blocked_by': str(blocker['_id'])}), 409
+        resumable = ['failed', 'cancelled']
+        # A pending/running migration whose job is no longer queued or running was orphaned by a crash
+        job = job_runner.get(migration['job_id']) if migration.get('job_id') else None
+        if not job or job['status'] not in ('queued', 'running'):
+            resumable += ['pending', 'running']
+        migration = template_migrations_collection.find_one_and_update(
+            {'_id': migration['_id'], 'status': {'$in': resumable}},
+            {'$set': {'status': 'pending', 'updated_at': datetime.utcnow()}}
+        )
+        if not migration:
+            return jsonify({'error': 'Migration is not resumable'}), 409
+        job_id = job_runner.submit('template_migration', {'migration_id': migration_id})
+        template_migrations_collection.update_one({'_id': migration['_id'], 'status': 'pending'},
+                                                  {'$set': {'job_id': job_id}})
+        return jsonify({'message': 'Migration resumed successfully', 'job_id': str(job_id)})
+    except Exception as e:
+        return error_response(e)
+
+# ------------------------ Job Routes ------------------------
+
+# Submit a background job
+@app.route('/productManagement/jobs', methods=['POST'])
+def submit_job():
+    try:
+        data = request.get_json() or {}
+        job_type = data.get('type')
+        if job_type not in job_runner.job_types:
+            return jsonify({'error': f"Job type must be one of {job_runner.job_types}"}), 400
+        job_id = job_runner.submit(job_type, data.get('params') or {})
+        return jsonify(serialize_doc(job_runner.get(job_id))), 202
+    except Exception as e:
+        return error_response(e)
+
+# List recent jobs, optionally filtered by status and type
+@app.route('/productManagement/jobs', methods=['GET'])
+def get_jobs():
+    try:
+        query = {}
+        if request.args.get('status'):
+            if request.args['status'] not in JOB_STATUSES:
+                return jsonify({'error': f"Status must be one of {sorted(JOB_STATUSES)}"}), 400
+            query['status'] = request.args['status']
+        if request.args.get('type'):
+            query['type'] = request.args['type']
+        limit = min(int(request.args.get('limit', 50)), 500)
+        jobs = jobs_collection.find(query).sort('_id', -1).limit(limit)
+        return jsonify({'jobs': [serialize_doc(job) for job in jobs], 'runner': job_runner.stats()})
+    except Exception as e:
+        return error_response(e)
+
+# Poll a single job
+@app.route('/productManagement/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    try:
+        job = job_runner.get(ObjectId(job_id))
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(serialize_doc(job))
+    except Exception as e:
+        return error_response(e)
+
+# Cancel a queued or running job
+@app.route('/productManagement/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    try:
+        job = job_runner.cancel(ObjectId(job_id))
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(serialize_doc(job))
+    except Exception as e:
+        return error_response(e)
+
+# ------------------------ Analytics Routes ------------------------
+
+def analytics_group_by(default='brand'):
+    group_by = request.args.get('group_by', default)
+    if group_by and group_by not in GROUP_ATTRIBUTES:
+        raise ValueError(f"group_by must be one of {sorted(GROUP_ATTRIBUTES)}")
+    return group_by
+
+# Margin (Selling Price vs Cost Price vs MSRP) by brand or category
+@app.route('/productManagement/analytics/margins', methods=['GET'])
+def get_margin_report():
+    try:
+        group_by = analytics_group_by()
+        return jsonify(margin_report(analytics_cache.columns(), group_by))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return error_response(e)
+
+# Products with Stock Quantity below Minimum Stock Level
+@app.route('/productManagement/analytics/low-stock', methods=['GET'])
+def get_low_stock_report():
+    try:
+        group_by = analytics_group_by()
+        limit = min(int(request.args.get('limit', 100)), 1000)
+        return jsonify(low_stock_report(analytics_cache.columns(), group_by, limit=limit))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return error_response(e)
+
+# Selling Price histogram and percentiles, optionally per brand or category
+@app.route('/productManagement/analytics/price-distribution', methods=['GET'])
+def get_price_distribution_report():
+    try:
+        group_by = analytics_group_by(default=None)
+        bins = min(max(int(request.args.get('bins', 10)), 1), 100)
+        return jsonify(price_distribution_report(analytics_cache.columns(), group_by, bins=bins))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return error_response(e)
+
+# ------------------------ Metrics ------------------------
+
+# Admission control queue depths/rejections and request coalescing counters
+@app.route('/productManagement/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify({
+        'admission': admission.stats(),
+        'single_flight': single_flight.stats(),
+        'autocomplete': autocomplete_index.stats(),
+        'read_model': read_model.stats() if read_model else {'enabled': False},
+        'analytics': analytics_cache.stats(),
+        'circuit_breaker': db_breaker.stats(),
+        'profiling': request_profiler.stats() if request_profiler else {'enabled': False}
+    })
 
 # ------------------------ Health Check ------------------------
 
@@ -163,12 +790,14 @@ def health_check():
         return jsonify({
             'status': 'healthy',
             'database': 'connected',
+            'circuit_breaker': db_breaker.stats(),
             'timestamp': datetime.utcnow().isoformat()
         })
     except Exception as e:
         return jsonify({
             'status': 'unhealthy',
             'error': str(e),
+            'circuit_breaker': db_breaker.stats(),
             'timestamp': datetime.utcnow().isoformat()
         }), 500
 
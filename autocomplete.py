@@ -0,0 +1,173 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Optional, Dict, List, Any, Tuple
+
+from utils import get_attribute_value, normalize_text
+
+# Entry kinds, in ranking order
+NAME, SKU, WORD = 0, 1, 2
+KIND_LABELS = {NAME: 'name', SKU: 'sku', WORD: 'word'}
+
+# Word entries index the rest of the name from each later word, truncated to keep memory bounded
+MAX_WORD_KEY_LENGTH = 32
+SCAN_FACTOR = 8
+
+
+def _product_keys(name: Optional[str], sku: Optional[str]) -> List[Tuple[str, int]]:
+    keys = []
+    normalized_name = normalize_text(name or '')
+    if normalized_name:
+        keys.append((normalized_name, NAME))
+        start = normalized_name.find(' ')
+        while start != -1:
+            keys.append((normalized_name[start + 1:start + 1 + MAX_WORD_KEY_LENGTH], WORD))
+            start = normalized_name.find(' ', start + 1)
+    if sku:
+        keys.append((str(sku).lower(), SKU))
+    return keys
+
+
+class PrefixIndex:
+    """Sorted in-memory index over normalized product names and SKUs for typeahead lookups"""
+
+    def __init__(self, products, rebuild_after_seconds: float = 300.0):
+        self.products = products
+        self.rebuild_after_seconds = rebuild_after_seconds
+        self._lock = threading.RLock()
+        # Serializes builds; held for the whole scan, unlike _lock which guards only the swap
+        self._build_lock = threading.RLock()
+        # Writes seen while a build is streaming the catalog: (product_id, (name, sku)) or (product_id, None)
+        self._buffer: Optional[List[Tuple[str, Optional[Tuple[Optional[str], Optional[str]]]]]] = None
+        self._entries: List[Tuple[str, int, str]] = []
+        self._keys_by_product: Dict[str, List[Tuple[str, int, str]]] = {}
+        self._labels: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        self._built_at: Optional[float] = None
+        self._rebuilding = False
+
+    @property
+    def ready(self) -> bool:
+        return self._built_at is not None
+
+    def build(self):
+        """Load the index from a streamed cursor and swap it in atomically
+
+        Writes made in this process while the cursor streams are buffered and replayed onto the
+        new index before the swap, so the older scan can neither drop nor resurrect them.
+        """
+        with self._build_lock:
+            with self._lock:
+                self._buffer = []
+            try:
+                entries, keys_by_product, labels = [], {}, {}
+                projection = {'name': 1, 'sku': 1, 'structure.attributes.name': 1, 'structure.attributes.value': 1}
+                for product in self.products.find({}, projection, batch_size=5000):
+                    product_id, name, sku = self._describe(product)
+                    product_entries = [(key, kind, product_id) for key, kind in _product_keys(name, sku)]
+                    entries.extend(product_entries)
+                    keys_by_product[product_id] = product_entries
+                    labels[product_id] = (name, sku)
+                entries.sort()
+            except Exception:
+                with self._lock:
+                    self._buffer = None
+                raise
+            with self._lock:
+                buffered, self._buffer = self._buffer, None
+                self._entries = entries
+                self._keys_by_product = keys_by_product
+                self._labels = labels
+                for product_id, label in buffered:
+                    self._remove(product_id)
+                    if label is not None:
+                        self._insert(product_id, *label)
+                self._built_at = time.monotonic()
+
+    def ensure_fresh(self) -> bool:
+        """Start a background build when the index is missing or old; returns whether it can serve searches
+
+        Builds never run inside a request, so a slow catalog scan cannot eat the request's database budget.
+        """
+        with self._lock:
+            # Writes made through other worker processes only show up after a rebuild
+            stale = not self.ready or time.monotonic() - self._built_at > self.rebuild_after_seconds
+            if stale and not self._rebuilding:
+                self._rebuilding = True
+                threading.Thread(target=self._rebuild, name='autocomplete-rebuild', daemon=True).start()
+            return self.ready
+
+    def upsert(self, product: Dict[str, Any]):
+        product_id, name, sku = self._describe(product)
+        with self._lock:
+            if self._buffer is not None:
+                self._buffer.append((product_id, (name, sku)))
+            if self.ready:
+                self._remove(product_id)
+                self._insert(product_id, name, sku)
+
+    def remove(self, product_id: str):
+        product_id = str(product_id)
+        with self._lock:
+            if self._buffer is not None:
+                self._buffer.append((product_id, None))
+            if self.ready:
+                self._remove(product_id)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Ranked top-k products whose name, SKU or a word of the name starts with the query"""
+        prefix = normalize_text(query)
+        sku_prefix = query.strip().lower()
+        candidates: Dict[str, Tuple[int, int, str]] = {}
+        with self._lock:
+            for current in {prefix, sku_prefix} - {''}:
+                position = bisect_left(self._entries, (current,))
+                scanned = 0
+                while position < len(self._entries) and scanned < limit * SCAN_FACTOR:
+                    key, kind, product_id = self._entries[position]
+                    if not key.startswith(current):
+                        break
+                    # Exact matches first, then by kind (name, SKU, later word), then shorter keys
+                    rank = (0 if key == current else 1, kind, len(key))
+                    if product_id not in candidates or rank < candidates[product_id][:3]:
+                        candidates[product_id] = rank + (KIND_LABELS[kind],)
+                    position += 1
+                    scanned += 1
+            ranked = sorted(candidates.items(), key=lambda item: item[1][:3])[:limit]
+            return [{'_id': product_id, 'name': self._labels[product_id][0], 'sku': self._labels[product_id][1],
+                     'match': rank[3]} for product_id, rank in ranked]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'products': len(self._keys_by_product),
+                'entries': len(self._entries),
+                'age_seconds': round(time.monotonic() - self._built_at, 1) if self.ready else None
+            }
+
+    def _rebuild(self):
+        try:
+            self.build()
+        finally:
+            self._rebuilding = False
+
+    def _insert(self, product_id: str, name: Optional[str], sku: Optional[str]):
+        product_entries = [(key, kind, product_id) for key, kind in _product_keys(name, sku)]
+        for entry in product_entries:
+            insort(self._entries, entry)
+        self._keys_by_product[product_id] = product_entries
+        self._labels[product_id] = (name, sku)
+
+    def _remove(self, product_id: str):
+        for entry in self._keys_by_product.pop(product_id, []):
+            position = bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+        self._labels.pop(product_id, None)
+
+    @staticmethod
+    def _describe(product: Dict[str, Any]) -> Tuple[str, Optional[str], Optional[str]]:
+        structure = product.get('structure') or []
+        name = get_attribute_value(structure, 'Product Name') or product.get('name')
+        sku = product.get('sku') or get_attribute_value(structure, 'SKU')
+        return str(product['_id']), name, sku
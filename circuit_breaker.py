@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Callable, Iterable
+
+import pymongo
+from flask import g, request, jsonify
+from pymongo.errors import ConnectionFailure, PyMongoError, ServerSelectionTimeoutError
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+def mongo_timeout_options(socket_timeout_ms: Optional[int] = None) -> Dict[str, int]:
+    """Short pymongo connect/server-selection timeouts so an unreachable server fails in seconds, not 30s
+
+    Operation time is not capped client-wide: requests get a per-request budget from the
+    CircuitBreaker, and background jobs use their own client with a per-operation socket timeout.
+    """
+    options = {
+        'serverSelectionTimeoutMS': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '2000')),
+        'connectTimeoutMS': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '2000'))
+    }
+    if socket_timeout_ms:
+        options['socketTimeoutMS'] = socket_timeout_ms
+    return options
+
+
+def is_database_unavailable(error: BaseException) -> bool:
+    """True for errors that mean Mongo is down or too slow, as opposed to a bad query or document"""
+    return isinstance(error, ConnectionFailure) or (isinstance(error, PyMongoError) and error.timeout)
+
+
+class CircuitBreaker:
+    """Stops sending requests to Mongo after repeated outage errors and probes it before letting traffic back
+
+    closed: requests flow; `failure_threshold` consecutive outage errors open the circuit.
+    open: requests fail fast with a 503 until `reset_timeout_seconds` have passed.
+    half_open: a single request runs `probe` (a ping); success closes the circuit, failure re-opens it.
+
+    Each admitted request runs its database calls under a pymongo.timeout() deadline:
+    `request_timeout_seconds`, or `bulk_timeout_seconds` for `bulk_endpoints`. A bulk request
+    outrunning its budget on a reachable server is not counted as an outage.
+    """
+
+    def __init__(self, probe: Callable[[], Any], failure_threshold: int = 5, reset_timeout_seconds: float = 10.0,
+                 exempt_endpoints: Iterable[str] = (), fallback_endpoints: Iterable[str] = (),
+                 bulk_endpoints: Iterable[str] = (), request_timeout_seconds: Optional[float] = None,
+                 bulk_timeout_seconds: Optional[float] = None):
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.exempt_endpoints = set(exempt_endpoints)
+        self.bulk_endpoints = set(bulk_endpoints)
+        self.request_timeout_seconds = request_timeout_seconds
+        self.bulk_timeout_seconds = bulk_timeout_seconds
+        # Endpoints that answer from a last-known-good cache instead of failing while the circuit is open
+        self.fallback_endpoints = set(fallback_endpoints)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._rejected = 0
+        self._times_opened = 0
+        self._last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._end_budget)
+
+    def allow_request(self) -> bool:
+        """Whether a request may use the database now; runs the half-open probe when it is due"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_timeout_seconds:
+                self._rejected += 1
+                return False
+            self._state = HALF_OPEN
+            self._probing = True
+
+        try:
+            self.probe()
+        except Exception as e:
+            self.record_failure(e)
+            with self._lock:
+                self._rejected += 1
+            return False
+        finally:
+            with self._lock:
+                self._probing = False
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._last_error = None
+        return True
+
+    def record_success(self):
+        # Only a successful probe closes an open circuit; late successes from requests started before it opened do not
+        with self._lock:
+            if self._state == CLOSED:
+                self._failures = 0
+
+    def counts_as_outage(self, error: BaseException) -> bool:
+        """Whether an error from the current request should count toward opening the circuit"""
+        if not is_database_unavailable(error):
+            return False
+        if isinstance(error, ServerSelectionTimeoutError) or not error.timeout:
+            return True
+        # An operation timeout on a bulk route means the work outran its budget, not that Mongo is down
+        return request.endpoint not in self.bulk_endpoints
+
+    def record_failure(self, error: BaseException):
+        with self._lock:
+            self._failures += 1
+            self._last_error = str(error)
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._times_opened += 1
+
+    def retry_after_seconds(self) -> int:
+        remaining = self.reset_timeout_seconds - (time.monotonic() - self._opened_at)
+        return max(1, int(remaining + 0.999))
+
+    def request_rejected(self) -> bool:
+        """True inside a fallback endpoint when the circuit refused this request the database"""
+        return g.get('circuit_rejected', False)
+
+    def unavailable_response(self):
+        response = jsonify({'error': 'Database is unavailable, please retry'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(self.retry_after_seconds())
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout_seconds': self.reset_timeout_seconds,
+                'retry_in_seconds': self.retry_after_seconds() if self._state != CLOSED else None,
+                'times_opened': self._times_opened,
+                'rejected': self._rejected,
+                'last_error': self._last_error
+            }
+
+    def _before_request(self):
+        if request.endpoint is None or request.endpoint in self.exempt_endpoints or request.method == 'OPTIONS':
+            return None
+        if self.allow_request():
+            self._start_budget()
+            return None
+        if request.endpoint in self.fallback_endpoints:
+            g.circuit_rejected = True
+            return None
+        return self.unavailable_response()
+
+    def _after_request(self, response):
+        if (response.status_code < 500 and request.endpoint not in self.exempt_endpoints
+                and not g.get('circuit_rejected')):
+            self.record_success()
+        return response
+
+    def _start_budget(self):
+        seconds = self.bulk_timeout_seconds if request.endpoint in self.bulk_endpoints else self.request_timeout_seconds
+        if seconds:
+            budget = pymongo.timeout(seconds)
+            budget.__enter__()
+            g.db_budget = budget
+
+    def _end_budget(self, exc=None):
+        budget = g.pop('db_budget', None)
+        if budget is not None:
+            budget.__exit__(None, None, None)
+
+
+class LastKnownGood:
+    """Most recent successful response body per key, kept for serving while the database is unreachable"""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._bodies: 'OrderedDict[str, bytes]' = OrderedDict()
+
+    def remember(self, key: str, body: bytes):
+        with self._lock:
+            self._bodies[key] = body
+            self._bodies.move_to_end(key)
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._bodies.get(key)
+
+    def forget(self, key: str):
+        with self._lock:
+            self._bodies.pop(key, None)
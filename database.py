@@ -3,16 +3,21 @@ from datetime import datetime
 import os
 from typing import Optional, Dict, List, Any
 from models import Product, ViewTemplate, ProductManager
+from sync import DEFAULT_RETENTION_DAYS
+from circuit_breaker import mongo_timeout_options
 
 class DatabaseManager:
     def __init__(self, mongo_uri: Optional[str] = None):
         self.mongo_uri = mongo_uri or os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
-        self.client = MongoClient(self.mongo_uri)
+        self.client = MongoClient(self.mongo_uri, **mongo_timeout_options())
         self.db = self.client.product_management
         
         # Collections
         self.products = self.db.products
         self.view_templates = self.db.view_templates
+        self.template_migrations = self.db.template_migrations
+        self.jobs = self.db.jobs
+        self.tombstones = self.db.tombstones
         
         # Create indexes for better performance
         self._create_indexes()
@@ -23,10 +28,25 @@ class DatabaseManager:
             # Product indexes
             self.products.create_index([("sku", 1)], unique=True, sparse=True)
             self.products.create_index([("created_at", -1)])
+            self.products.create_index([("structure.attributes.name", 1)])
+            self.products.create_index([("updated_at", 1), ("_id", 1)])
+            self.products.create_index([("dedupe_bands", 1)])
             
             # View template indexes
             self.view_templates.create_index([("name", 1)])
             self.view_templates.create_index([("is_default", 1)])
+
+            # Template migration indexes
+            self.template_migrations.create_index([("status", 1), ("_id", 1)])
+
+            # Background job indexes
+            self.jobs.create_index([("status", 1), ("_id", 1)])
+            self.jobs.create_index([("type", 1), ("_id", -1)])
+
+            # Deletion tombstones for delta sync, expired after the retention window
+            retention_days = int(os.getenv('TOMBSTONE_RETENTION_DAYS', str(DEFAULT_RETENTION_DAYS)))
+            self.tombstones.create_index([("deleted_at", 1)], expireAfterSeconds=retention_days * 86400)
+            self.tombstones.create_index([("deleted_at", 1), ("_id", 1)])
             
             print("Database indexes created successfully")
         except Exception as e:
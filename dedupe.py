@@ -0,0 +1,205 @@
+import hashlib
+import random
+from typing import Optional, Dict, List, Any, Iterable
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from utils import get_attribute_value, normalize_text
+
+DEDUPE_ATTRIBUTES = ('Product Name', 'Brand', 'Short Description')
+SHINGLE_SIZE = 4
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+DEFAULT_THRESHOLD = 0.6
+MAX_BUCKET_SIZE = 200
+# Oversized buckets are read up to this many members and split against at most MAX_LEADERS leaders
+MAX_OVERSIZED_BUCKET_MEMBERS = 5000
+MAX_LEADERS = 50
+
+_PRIME = (1 << 61) - 1
+# Fixed seed: signatures are persisted, so the permutations must be identical in every process
+_rng = random.Random(20240115)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+
+def _stable_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+def dedupe_text(product: Dict[str, Any]) -> str:
+    """Text that identifies a product for near-duplicate matching"""
+    structure = product.get('structure') or []
+    parts = [get_attribute_value(structure, name) for name in DEDUPE_ATTRIBUTES]
+    if not parts[0]:
+        parts[0] = product.get('name')
+    return normalize_text(' '.join(str(part) for part in parts if part))
+
+
+def shingles(text: str) -> set:
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(shingle_set: Iterable[str]) -> List[int]:
+    hashes = [_stable_hash(shingle) for shingle in shingle_set]
+    if not hashes:
+        return []
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def lsh_bands(signature: List[int]) -> List[str]:
+    """Band keys: products sharing any key are candidate duplicates"""
+    if not signature:
+        return []
+    bands = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(repr(rows).encode(), digest_size=8).hexdigest()
+        bands.append(f"{band}:{digest}")
+    return bands
+
+
+def signature_fields(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields stored on a product so it can be matched against the rest of the catalog"""
+    signature = minhash_signature(shingles(dedupe_text(product)))
+    return {'dedupe_signature': signature, 'dedupe_bands': lsh_bands(signature)}
+
+
+def estimate_similarity(first: List[int], second: List[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    if not first or not second:
+        return 0.0
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+def find_duplicates(products, fields: Dict[str, Any], exclude_id: Optional[ObjectId] = None,
+                    threshold: float = DEFAULT_THRESHOLD, limit: int = 20) -> List[Dict[str, Any]]:
+    """Look up likely duplicates of a product through the indexed band keys"""
+    if not fields.get('dedupe_bands'):
+        return []
+    query: Dict[str, Any] = {'dedupe_bands': {'$in': fields['dedupe_bands']}}
+    if exclude_id is not None:
+        query['_id'] = {'$ne': exclude_id}
+
+    matches = []
+    for candidate in products.find(query, {'name': 1, 'sku': 1, 'dedupe_signature': 1}).limit(MAX_BUCKET_SIZE):
+        similarity = estimate_similarity(fields['dedupe_signature'], candidate.get('dedupe_signature'))
+        if similarity >= threshold:
+            matches.append({'_id': str(candidate['_id']), 'name': candidate.get('name'),
+                            'sku': candidate.get('sku'), 'similarity': round(similarity, 3)})
+    matches.sort(key=lambda match: match['similarity'], reverse=True)
+    return matches[:limit]
+
+
+def _leader_groups(members: List[ObjectId], details: Dict[ObjectId, Dict[str, Any]], threshold: float):
+    """Split an oversized bucket by comparing each member to a bounded set of group leaders
+
+    Returns (edges, truncated): edges join each member to the leader it matches, and truncated is
+    True when members matching none of the first MAX_LEADERS leaders had to be left out.
+    """
+    leaders, edges, truncated = [], [], False
+    for member in members:
+        signature = details.get(member, {}).get('dedupe_signature')
+        if not signature:
+            continue
+        leader = next((leader for leader in leaders
+                       if estimate_similarity(details[leader]['dedupe_signature'], signature) >= threshold), None)
+        if leader is not None:
+            edges.append((leader, member))
+        elif len(leaders) < MAX_LEADERS:
+            leaders.append(member)
+        else:
+            truncated = True
+    return edges, truncated
+
+
+def find_duplicate_clusters(products, threshold: float = DEFAULT_THRESHOLD) -> Dict[str, Any]:
+    """Group the whole catalog into clusters of likely duplicates
+
+    Buckets of shared band keys are built server-side; only candidate ids and
+    their signatures are read back, so the cost follows the number of candidates.
+    Buckets too large for pairwise comparison (typically many near-identical
+    resubmissions) are split against a bounded set of leaders instead; the
+    result is flagged truncated when members of such a bucket had to be skipped.
+    """
+    buckets = products.aggregate([
+        {'$match': {'dedupe_bands.0': {'$exists': True}}},
+        {'$project': {'dedupe_bands': 1}},
+        {'$unwind': '$dedupe_bands'},
+        {'$group': {'_id': '$dedupe_bands', 'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}},
+        {'$project': {'count': 1, 'ids': {'$slice': ['$ids', MAX_OVERSIZED_BUCKET_MEMBERS]}}}
+    ], allowDiskUse=True)
+
+    pairs, oversized, truncated = set(), [], False
+    for bucket in buckets:
+        ids = sorted(bucket['ids'])
+        if bucket['count'] > MAX_BUCKET_SIZE:
+            oversized.append(ids)
+            truncated = truncated or bucket['count'] > len(ids)
+            continue
+        for i, first in enumerate(ids):
+            for second in ids[i + 1:]:
+                pairs.add((first, second))
+    if not pairs and not oversized:
+        return {'clusters': [], 'truncated': truncated}
+
+    candidate_ids = list({product_id for pair in pairs for product_id in pair} |
+                         {product_id for ids in oversized for product_id in ids})
+    details = {product['_id']: product for product in
+               products.find({'_id': {'$in': candidate_ids}}, {'name': 1, 'sku': 1, 'dedupe_signature': 1})}
+
+    parent = {}
+
+    def root(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for first, second in pairs:
+        if first in details and second in details and estimate_similarity(
+                details[first].get('dedupe_signature'), details[second].get('dedupe_signature')) >= threshold:
+            parent[root(first)] = root(second)
+    for ids in oversized:
+        edges, skipped = _leader_groups(ids, details, threshold)
+        truncated = truncated or skipped
+        for leader, member in edges:
+            parent[root(member)] = root(leader)
+
+    clusters: Dict[ObjectId, List[ObjectId]] = {}
+    for node in parent:
+        clusters.setdefault(root(node), []).append(node)
+    return {
+        'clusters': [
+            {'size': len(members),
+             'products': [{'_id': str(member), 'name': details[member].get('name'), 'sku': details[member].get('sku')}
+                          for member in sorted(members)]}
+            for members in sorted(clusters.values(), key=len, reverse=True)
+            if len(members) > 1
+        ],
+        'truncated': truncated
+    }
+
+
+def backfill_signatures(products, job=None, chunk_size: int = 500) -> Dict[str, Any]:
+    """Compute and store signatures for products that do not have one yet"""
+    query = {'dedupe_signature': {'$exists': False}}
+    if job:
+        job.report(total=products.count_documents(query))
+    updated = 0
+    while True:
+        if job and job.is_cancelled():
+            return {'status': 'cancelled', 'updated': updated}
+        chunk = list(products.find(query, {'name': 1, 'structure': 1}).sort('_id', 1).limit(chunk_size))
+        if not chunk:
+            return {'status': 'completed', 'updated': updated}
+        products.bulk_write([UpdateOne({'_id': product['_id']}, {'$set': signature_fields(product)})
+                             for product in chunk], ordered=False)
+        updated += len(chunk)
+        if job:
+            job.increment(processed=len(chunk))
@@ -0,0 +1,161 @@
+from typing import Dict, List, Any, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from utils import get_attribute_value, parse_stock_quantity
+
+STOCK_ATTRIBUTE = 'Stock Quantity'
+SKU_ATTRIBUTE = 'SKU'
+MAX_EVENTS_PER_BATCH = 5000
+# Ids of the most recent batches applied to a product; a batch is reported applied if its id is here
+RECENT_BATCHES_KEPT = 50
+
+# Stock Quantity as stored in structure, for products written before the typed stock_quantity field existed
+_STRUCTURE_STOCK = {'$let': {
+    'vars': {'attr': {'$arrayElemAt': [{'$filter': {
+        'input': {'$reduce': {'input': '$structure.attributes', 'initialValue': [],
+                              'in': {'$concatArrays': ['$$value', '$$this']}}},
+        'as': 'attr',
+        'cond': {'$eq': ['$$attr.name', STOCK_ATTRIBUTE]}
+    }}, 0]}},
+    'in': {'$convert': {'input': '$$attr.value', 'to': 'int', 'onError': 0, 'onNull': 0}}
+}}
+
+CURRENT_STOCK = {'$ifNull': ['$stock_quantity', _STRUCTURE_STOCK]}
+
+
+def coalesce_stock_events(events: List[Dict[str, Any]]) -> Tuple[Dict[str, int], List[str]]:
+    """Sum stock deltas per SKU, returning (deltas, validation errors)"""
+    deltas: Dict[str, int] = {}
+    errors = []
+    for i, event in enumerate(events):
+        sku = event.get('sku') if isinstance(event, dict) else None
+        delta = event.get('delta') if isinstance(event, dict) else None
+        if not isinstance(sku, str) or not sku:
+            errors.append(f"Event {i+1} must have a sku")
+        elif isinstance(delta, bool) or not isinstance(delta, int):
+            errors.append(f"Event {i+1} must have an integer delta")
+        else:
+            deltas[sku] = deltas.get(sku, 0) + delta
+    return deltas, errors
+
+
+def build_stock_update(sku: str, delta: int, batch_id: ObjectId) -> UpdateOne:
+    """Atomically add a delta to a product's stock, refusing to take it below zero"""
+    query: Dict[str, Any] = {'sku': sku}
+    if delta < 0:
+        query['$expr'] = {'$gte': [CURRENT_STOCK, -delta]}
+    pipeline = [
+        {'$set': {
+            'stock_quantity': {'$add': [CURRENT_STOCK, delta]},
+            'recent_inventory_batches': {'$slice': [
+                {'$concatArrays': [{'$ifNull': ['$recent_inventory_batches', []]}, [batch_id]]},
+                -RECENT_BATCHES_KEPT
+            ]},
+            'updated_at': '$$NOW'
+        }},
+        # Keep the Stock Quantity attribute in structure in step with the typed field
+        {'$set': {'structure': {'$map': {'input': '$structure', 'as': 'section', 'in': {
+            '$mergeObjects': ['$$section', {'attributes': {'$map': {
+                'input': '$$section.attributes', 'as': 'attr', 'in': {'$cond': [
+                    {'$eq': ['$$attr.name', STOCK_ATTRIBUTE]},
+                    {'$mergeObjects': ['$$attr', {'value': '$stock_quantity'}]},
+                    '$$attr'
+                ]}
+            }}}]
+        }}}}}
+    ]
+    return UpdateOne(query, pipeline)
+
+
+def apply_stock_deltas(products, deltas: Dict[str, int]) -> Dict[str, Any]:
+    """Apply coalesced per-SKU deltas with one bulk_write and report which were applied or rejected"""
+    if not deltas:
+        return {'applied': [], 'rejected': []}
+
+    batch_id = ObjectId()
+    products.bulk_write([build_stock_update(sku, delta, batch_id) for sku, delta in deltas.items()],
+                        ordered=False)
+
+    # Each applied update appends the batch id to a bounded list, so one indexed read tells applied
+    # from rejected even when later batches have touched the same SKU in the meantime
+    applied, rejected, found = [], [], set()
+    for product in products.find({'sku': {'$in': list(deltas)}},
+                                 {'sku': 1, 'stock_quantity': 1, 'recent_inventory_batches': 1}):
+        found.add(product['sku'])
+        if batch_id in product.get('recent_inventory_batches', []):
+            applied.append({'sku': product['sku'], 'delta': deltas[product['sku']],
+                            'stock_quantity': product['stock_quantity']})
+        else:
+            rejected.append({'sku': product['sku'], 'delta': deltas[product['sku']],
+                             'reason': 'Stock quantity must be non-negative'})
+    rejected += [{'sku': sku, 'delta': delta, 'reason': 'Product not found'}
+                 for sku, delta in deltas.items() if sku not in found]
+    return {'applied': applied, 'rejected': rejected}
+
+
+def indexed_fields(structure: List[Dict[str, Any]], strict: bool = True) -> Dict[str, Any]:
+    """Top-level sku and stock_quantity mirrored from a product structure (only those that are present)
+
+    A Stock Quantity that is not a non-negative integer raises ValueError, or is left out when not `strict`.
+    """
+    fields: Dict[str, Any] = {}
+    sku = get_attribute_value(structure, SKU_ATTRIBUTE)
+    if sku:
+        fields['sku'] = sku
+    stock = get_attribute_value(structure, STOCK_ATTRIBUTE)
+    if stock is not None and stock != '':
+        try:
+            fields['stock_quantity'] = parse_stock_quantity(stock)
+        except ValueError:
+            if strict:
+                raise
+    return fields
+
+
+def backfill_indexed_fields(products, job=None, chunk_size: int = 500) -> Dict[str, Any]:
+    """Set sku/stock_quantity on products written before those fields existed, so stock batches can find them
+
+    Products whose SKU is already taken by another product are counted as conflicts and left unchanged.
+    """
+    query: Dict[str, Any] = {'$or': [{'sku': {'$exists': False}}, {'stock_quantity': {'$exists': False}}]}
+    if job:
+        job.report(total=products.count_documents(query))
+    updated, conflicts, last_id = 0, 0, None
+    while True:
+        if job and job.is_cancelled():
+            return {'status': 'cancelled', 'updated': updated, 'conflicts': conflicts}
+        chunk_query = query if last_id is None else {'$and': [query, {'_id': {'$gt': last_id}}]}
+        chunk = list(products.find(chunk_query, {'structure': 1, 'sku': 1, 'stock_quantity': 1})
+                     .sort('_id', 1).limit(chunk_size))
+        if not chunk:
+            return {'status': 'completed', 'updated': updated, 'conflicts': conflicts}
+        last_id = chunk[-1]['_id']
+
+        updates = []
+        for product in chunk:
+            fields = {key: value for key, value in indexed_fields(product.get('structure'), strict=False).items()
+                      if key not in product}
+            if fields:
+                updates.append(UpdateOne({'_id': product['_id']}, {'$set': fields}))
+        written = _bulk_write_counting_conflicts(products, updates)
+        updated += written[0]
+        conflicts += written[1]
+        if job:
+            job.increment(processed=len(chunk), updated=written[0], conflicts=written[1])
+
+
+def _bulk_write_counting_conflicts(products, updates: List[UpdateOne]) -> Tuple[int, int]:
+    if not updates:
+        return 0, 0
+    try:
+        result = products.bulk_write(updates, ordered=False)
+        return result.modified_count, 0
+    except BulkWriteError as e:
+        # Duplicate SKUs (unique index) fail individually; the rest of the chunk is still written
+        duplicates = sum(1 for error in e.details['writeErrors'] if error.get('code') == 11000)
+        if duplicates != len(e.details['writeErrors']):
+            raise
+        return e.details['nModified'], duplicates
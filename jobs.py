@@ -0,0 +1,241 @@
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Any, Callable
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+JOB_STATUSES = {"queued", "running", "succeeded", "failed", "cancelled"}
+
+
+class JobCancelled(Exception):
+    """Raised by a job handler to stop early after a cancel request"""
+
+
+class JobContext:
+    """Handle passed to job handlers for reading params, reporting progress and checking for cancellation"""
+
+    def __init__(self, runner: 'JobRunner', job: Dict[str, Any]):
+        self.runner = runner
+        self.job_id = job['_id']
+        self.type = job['type']
+        self.params = job.get('params') or {}
+        self._cancelled = bool(job.get('cancel_requested'))
+
+    def report(self, **counters):
+        """Overwrite progress counters (e.g. total=..., processed=...)"""
+        self._update({'$set': {f'progress.{key}': value for key, value in counters.items()}})
+
+    def increment(self, **counters):
+        """Add to progress counters"""
+        self._update({'$inc': {f'progress.{key}': value for key, value in counters.items()}})
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled or self.runner.cancel_requested(self.job_id)
+
+    def check_cancelled(self):
+        if self.is_cancelled():
+            raise JobCancelled()
+
+    def _update(self, update: Dict[str, Any]):
+        update.setdefault('$set', {})['heartbeat_at'] = datetime.utcnow()
+        # The heartbeat write also picks up cancel requests made by other worker processes
+        job = self.runner.jobs.find_one_and_update(
+            {'_id': self.job_id}, update,
+            projection={'cancel_requested': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if job and job.get('cancel_requested'):
+            self._cancelled = True
+
+
+class JobRunner:
+    """In-process background job runner with Mongo-persisted job records and per-type concurrency limits"""
+
+    def __init__(self, jobs_collection, max_workers: int = 4, stale_after_seconds: int = 300):
+        self.jobs = jobs_collection
+        self.max_workers = max_workers
+        self.stale_after = timedelta(seconds=stale_after_seconds)
+        self.instance_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._handlers: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, deque] = {}
+        self._running: Dict[str, int] = {}
+        self._cancelled: set = set()
+        self._started = False
+
+    def register(self, job_type: str, handler: Callable[[JobContext], Any],
+                 concurrency: int = 1, resumable: bool = False):
+        """Register a handler; resumable jobs are re-queued instead of failed after a restart"""
+        self._handlers[job_type] = {'handler': handler, 'concurrency': concurrency, 'resumable': resumable}
+        self._pending.setdefault(job_type, deque())
+        self._running.setdefault(job_type, 0)
+
+    @property
+    def job_types(self) -> List[str]:
+        return sorted(self._handlers)
+
+    def submit(self, job_type: str, params: Optional[Dict[str, Any]] = None) -> ObjectId:
+        """Persist a queued job and schedule it"""
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}. Must be one of {self.job_types}")
+        now = datetime.utcnow()
+        result = self.jobs.insert_one({
+            'type': job_type,
+            'params': params or {},
+            'status': 'queued',
+            'progress': {},
+            'result': None,
+            'error': None,
+            'cancel_requested': False,
+            'owner': None,
+            'created_at': now,
+            'updated_at': now,
+            'started_at': None,
+            'finished_at': None,
+            'heartbeat_at': None
+        })
+        self._enqueue(job_type, result.inserted_id)
+        return result.inserted_id
+
+    def get(self, job_id: ObjectId) -> Optional[Dict[str, Any]]:
+        return self.jobs.find_one({'_id': job_id})
+
+    def cancel(self, job_id: ObjectId) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job immediately, or ask a running one to stop at its next checkpoint"""
+        now = datetime.utcnow()
+        job = self.jobs.find_one_and_update(
+            {'_id': job_id, 'status': 'queued'},
+            {'$set': {'status': 'cancelled', 'cancel_requested': True, 'finished_at': now, 'updated_at': now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if job:
+            return job
+        job = self.jobs.find_one_and_update(
+            {'_id': job_id, 'status': 'running'},
+            {'$set': {'cancel_requested': True, 'updated_at': now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if job:
+            with self._lock:
+                self._cancelled.add(job_id)
+            return job
+        return self.get(job_id)
+
+    def cancel_requested(self, job_id: ObjectId) -> bool:
+        with self._lock:
+            return job_id in self._cancelled
+
+    def start(self):
+        """Recover orphaned jobs now, then keep heartbeating this runner's jobs and sweeping for stale ones
+
+        A job whose owner crashed keeps a fresh heartbeat for up to stale_after, so a single sweep at
+        startup misses it after a fast restart; the periodic sweep picks it up once it goes stale.
+        """
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.recover()
+        threading.Thread(target=self._maintenance_loop, name='job-maintenance', daemon=True).start()
+
+    def recover(self):
+        """Re-queue or fail jobs orphaned by a restart or a dead worker, then schedule everything still queued"""
+        now = datetime.utcnow()
+        stale = {'status': 'running', 'owner': {'$ne': self.instance_id},
+                 '$or': [{'heartbeat_at': None}, {'heartbeat_at': {'$lt': now - self.stale_after}}]}
+        for job in self.jobs.find(stale, {'type': 1}):
+            spec = self._handlers.get(job['type'])
+            if spec and spec['resumable']:
+                update = {'status': 'queued', 'owner': None, 'updated_at': now}
+            else:
+                update = {'status': 'failed', 'error': 'Interrupted by restart', 'finished_at': now, 'updated_at': now}
+            self.jobs.update_one({'_id': job['_id'], 'status': 'running'}, {'$set': update})
+
+        for job in self.jobs.find({'status': 'queued'}, {'type': 1}).sort('_id', 1):
+            if job['type'] in self._handlers:
+                self._enqueue(job['type'], job['_id'])
+
+    def heartbeat(self):
+        """Mark every job this runner is executing as alive, including ones between progress reports"""
+        self.jobs.update_many({'status': 'running', 'owner': self.instance_id},
+                              {'$set': {'heartbeat_at': datetime.utcnow()}})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                job_type: {
+                    'running': self._running[job_type],
+                    'queued': len(self._pending[job_type]),
+                    'concurrency': spec['concurrency']
+                }
+                for job_type, spec in self._handlers.items()
+            }
+
+    def _maintenance_loop(self):
+        # Heartbeat well inside stale_after so live jobs are never mistaken for orphans
+        interval = max(self.stale_after.total_seconds() / 3, 1)
+        while True:
+            time.sleep(interval)
+            try:
+                self.heartbeat()
+                self.recover()
+            except Exception:
+                # Mongo may be briefly unreachable; try again on the next tick
+                pass
+
+    def _enqueue(self, job_type: str, job_id: ObjectId):
+        with self._lock:
+            if job_id not in self._pending[job_type]:
+                self._pending[job_type].append(job_id)
+        self._dispatch()
+
+    def _dispatch(self):
+        with self._lock:
+            for job_type, spec in self._handlers.items():
+                pending = self._pending[job_type]
+                while pending and self._running[job_type] < spec['concurrency']:
+                    job_id = pending.popleft()
+                    self._running[job_type] += 1
+                    self._executor.submit(self._run, job_type, job_id)
+
+    def _run(self, job_type: str, job_id: ObjectId):
+        try:
+            self._execute(job_id)
+        finally:
+            with self._lock:
+                self._running[job_type] -= 1
+                self._cancelled.discard(job_id)
+            self._dispatch()
+
+    def _execute(self, job_id: ObjectId):
+        now = datetime.utcnow()
+        # Claim atomically so a job is never run by two workers or after being cancelled
+        job = self.jobs.find_one_and_update(
+            {'_id': job_id, 'status': 'queued'},
+            {'$set': {'status': 'running', 'owner': self.instance_id, 'started_at': now,
+                      'heartbeat_at': now, 'updated_at': now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not job:
+            return
+
+        context = JobContext(self, job)
+        try:
+            result = self._handlers[job['type']]['handler'](context)
+            status = 'cancelled' if context.is_cancelled() else 'succeeded'
+            update = {'status': status, 'result': result}
+        except JobCancelled:
+            update = {'status': 'cancelled'}
+        except Exception as e:
+            update = {'status': 'failed', 'error': str(e)}
+
+        now = datetime.utcnow()
+        update.update({'finished_at': now, 'updated_at': now})
+        self.jobs.update_one({'_id': job_id}, {'$set': update})
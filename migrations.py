@@ -0,0 +1,448 @@
+import time
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Callable
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_THROTTLE_SECONDS = 0.05
+
+
+def _template_attributes(template: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Every attribute of a template document, plus its owning section title"""
+    return [dict(attr, section_title=section.get('title'))
+            for section in (template or {}).get('sections', [])
+            for attr in section.get('attributes', [])]
+
+
+def _match_attributes(old_attrs: List[Dict[str, Any]], new_attrs: List[Dict[str, Any]]):
+    """Pair old and new attributes by id, then pair what is left by name
+
+    Returns (pairs, unmatched old, unmatched new). Name matching covers updates that resend
+    sections without ids, or with fresh ids as ViewTemplate.copy creates.
+    """
+    unmatched_new = list(new_attrs)
+    new_by_id = {str(attr['id']): attr for attr in new_attrs if attr.get('id') is not None}
+    pairs, unmatched_old = [], []
+    for old in old_attrs:
+        new = new_by_id.pop(str(old['id']), None) if old.get('id') is not None else None
+        if new is None:
+            unmatched_old.append(old)
+            continue
+        pairs.append((old, new))
+        unmatched_new.remove(new)
+
+    still_unmatched = []
+    for old in unmatched_old:
+        new = next((attr for attr in unmatched_new if attr['name'] == old['name']), None)
+        if new is None:
+            still_unmatched.append(old)
+            continue
+        pairs.append((old, new))
+        unmatched_new.remove(new)
+    return pairs, still_unmatched, unmatched_new
+
+
+def compute_template_diff(old_template: Optional[Dict[str, Any]],
+                          new_template: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Compute the attribute-level changes between two versions of a view template
+
+    Removals delete stored values catalog-wide, so they are only derived when every attribute
+    of the new template carries an id; otherwise an unmatched attribute is left in place.
+    """
+    new_attrs = _template_attributes(new_template)
+    pairs, unmatched_old, unmatched_new = _match_attributes(_template_attributes(old_template), new_attrs)
+
+    diff = {'renamed': [], 'removed': [], 'retyped': [], 'added': []}
+    for old, new in pairs:
+        if new['name'] != old['name']:
+            diff['renamed'].append({'from': old['name'], 'to': new['name']})
+        if new.get('type') != old.get('type'):
+            diff['retyped'].append({'name': new['name'], 'from': old.get('type'), 'to': new.get('type'),
+                                    'options': new.get('options') or []})
+    if all(attr.get('id') is not None for attr in new_attrs):
+        diff['removed'] = [{'name': old['name']} for old in unmatched_old]
+    for new in unmatched_new:
+        diff['added'].append({'name': new['name'], 'section_title': new['section_title']})
+    return diff
+
+
+def diff_is_empty(diff: Dict[str, Any]) -> bool:
+    return not any(diff.values())
+
+
+def owned_products_filter(template_id: str, is_default: bool) -> Dict[str, Any]:
+    """Query matching the products a template owns; those without a view_template_id belong to the default"""
+    template_id = str(template_id)
+    return {'view_template_id': {'$in': [template_id, None]} if is_default else template_id}
+
+
+def build_migration_filter(diff: Dict[str, Any], template_id: str, is_default: bool = False) -> Dict[str, Any]:
+    """Query matching only the products of the template that a template diff actually touches"""
+    names = [change['name'] for change in diff['removed']]
+    names += [change['from'] for change in diff['renamed']]
+    names += [change['name'] for change in diff['retyped']]
+
+    clauses = []
+    if names:
+        clauses.append({'structure.attributes.name': {'$in': names}})
+    for change in diff['added']:
+        clauses.append({'structure.title': change['section_title'],
+                        'structure.attributes.name': {'$ne': change['name']}})
+    if not clauses:
+        return {'_id': {'$exists': False}}
+    touched = clauses[0] if len(clauses) == 1 else {'$or': clauses}
+    return {'$and': [owned_products_filter(template_id, is_default), touched]}
+
+
+# Attribute types stored as native BSON values rather than strings
+TYPED_ATTRIBUTE_TYPES = ('Number', 'Boolean', 'Date')
+TRUE_STRINGS = ['true', '1', 'yes']
+FALSE_STRINGS = ['false', '0', 'no']
+
+
+def _convert_value(value_expr: Any, change: Dict[str, Any]) -> Any:
+    """Aggregation expression converting an attribute value to its new (native) type, or null if it does not fit"""
+    new_type = change['to']
+    value_type = {'$type': value_expr}
+    if new_type == 'Number':
+        # Whole numbers become integers, anything else a double
+        as_double = {'$convert': {'input': value_expr, 'to': 'double', 'onError': None, 'onNull': None}}
+        return {'$switch': {'branches': [
+            {'case': {'$isNumber': value_expr}, 'then': value_expr},
+            {'case': {'$eq': [value_type, 'string']},
+             'then': {'$convert': {'input': value_expr, 'to': 'long', 'onError': as_double, 'onNull': None}}}
+        ], 'default': None}}
+    if new_type == 'Boolean':
+        text = {'$toLower': {'$trim': {'input': value_expr}}}
+        return {'$switch': {'branches': [
+            {'case': {'$eq': [value_type, 'bool']}, 'then': value_expr},
+            {'case': {'$ne': [value_type, 'string']}, 'then': None},
+            {'case': {'$in': [text, TRUE_STRINGS]}, 'then': True},
+            {'case': {'$in': [text, FALSE_STRINGS]}, 'then': False}
+        ], 'default': None}}
+    if new_type == 'Date':
+        return {'$switch': {'branches': [
+            {'case': {'$eq': [value_type, 'date']}, 'then': value_expr},
+            {'case': {'$eq': [value_type, 'string']},
+             'then': {'$dateFromString': {'dateString': {'$substrCP': [value_expr, 0, 10]}, 'format': '%Y-%m-%d',
+                                          'onError': None, 'onNull': None}}}
+        ], 'default': None}}
+    if new_type == 'Picklist':
+        return {'$cond': [{'$in': [value_expr, change['options']]}, value_expr, None]}
+    return {'$switch': {'branches': [
+        {'case': {'$eq': [value_expr, None]}, 'then': None},
+        {'case': {'$eq': [value_type, 'date']}, 'then': {'$dateToString': {'date': value_expr, 'format': '%Y-%m-%d'}}}
+    ], 'default': {'$toString': value_expr}}}
+
+
+def build_migration_pipeline(diff: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Build an update pipeline that rewrites product structure according to a template diff"""
+    attrs = '$$section.attributes'
+
+    removed = [change['name'] for change in diff['removed']]
+    if removed:
+        attrs = {'$filter': {'input': attrs, 'as': 'attr',
+                             'cond': {'$not': [{'$in': ['$$attr.name', removed]}]}}}
+
+    if diff['renamed']:
+        attrs = {'$map': {'input': attrs, 'as': 'attr', 'in': {'$mergeObjects': ['$$attr', {
+            'name': {'$switch': {
+                'branches': [{'case': {'$eq': ['$$attr.name', change['from']]}, 'then': change['to']}
+                             for change in diff['renamed']],
+                'default': '$$attr.name'
+            }}
+        }]}}}
+
+    for change in diff['retyped']:
+        replacement = {'$mergeObjects': ['$$attr', {'value': _convert_value('$$attr.value', change)}]}
+        if change['from'] == 'Picklist':
+            replacement = {'$arrayToObject': {'$filter': {
+                'input': {'$objectToArray': replacement},
+                'as': 'field',
+                'cond': {'$ne': ['$$field.k', 'options']}
+            }}}
+        attrs = {'$map': {'input': attrs, 'as': 'attr', 'in': {
+            '$cond': [{'$eq': ['$$attr.name', change['name']]}, replacement, '$$attr']
+        }}}
+
+    for change in diff['added']:
+        attrs = {'$let': {'vars': {'attrs': attrs}, 'in': {'$cond': [
+            {'$and': [{'$eq': ['$$section.title', change['section_title']]},
+                      {'$not': [{'$in': [change['name'], '$$attrs.name']}]}]},
+            {'$concatArrays': ['$$attrs', [{'name': change['name'], 'value': None}]]},
+            '$$attrs'
+        ]}}}
+
+    return [{'$set': {
+        'structure': {'$map': {'input': '$structure', 'as': 'section', 'in': {
+            '$mergeObjects': ['$$section', {'attributes': attrs}]
+        }}},
+        'updated_at': '$$NOW'
+    }}]
+
+
+# Drops the embedded 'options' array from every product attribute; options live on the template
+STRIP_PICKLIST_OPTIONS_PIPELINE = [{'$set': {
+    'structure': {'$map': {'input': '$structure', 'as': 'section', 'in': {
+        '$mergeObjects': ['$$section', {'attributes': {'$map': {
+            'input': '$$section.attributes', 'as': 'attr', 'in': {'$arrayToObject': {'$filter': {
+                'input': {'$objectToArray': '$$attr'},
+                'as': 'field',
+                'cond': {'$ne': ['$$field.k', 'options']}
+            }}}
+        }}}]
+    }}}
+}}]
+
+
+def apply_pipeline_in_chunks(collection, query: Dict[str, Any], pipeline: List[Dict[str, Any]],
+                             chunk_size: int = DEFAULT_CHUNK_SIZE,
+                             throttle_seconds: float = DEFAULT_THROTTLE_SECONDS,
+                             start_after: Optional[ObjectId] = None, job=None,
+                             on_chunk: Optional[Callable[[ObjectId, Any], None]] = None):
+    """Apply an update pipeline to matching documents in _id-range chunks
+
+    Only _ids are read into the app. Returns (finished, last_id); finished is
+    False when the job was cancelled, and last_id is the resume checkpoint.
+    """
+    last_id = start_after
+    while True:
+        if job and job.is_cancelled():
+            return False, last_id
+
+        chunk_query = query if last_id is None else {'$and': [query, {'_id': {'$gt': last_id}}]}
+        ids = [doc['_id'] for doc in collection.find(chunk_query, {'_id': 1}).sort('_id', 1).limit(chunk_size)]
+        if not ids:
+            return True, last_id
+
+        result = collection.update_many({'$and': [query, {'_id': {'$gte': ids[0], '$lte': ids[-1]}}]}, pipeline)
+        last_id = ids[-1]
+        if on_chunk:
+            on_chunk(last_id, result)
+        if job:
+            job.increment(processed=result.matched_count, modified=result.modified_count, chunks=1)
+        if throttle_seconds:
+            time.sleep(throttle_seconds)
+
+
+def measure_collection_size(collection, query: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    """Count documents and total BSON bytes server-side"""
+    pipeline = [{'$match': query or {}},
+                {'$group': {'_id': None, 'documents': {'$sum': 1}, 'bytes': {'$sum': {'$bsonSize': '$$ROOT'}}}}]
+    totals = next(collection.aggregate(pipeline), None) or {}
+    return {'documents': totals.get('documents', 0), 'bytes': totals.get('bytes', 0)}
+
+
+def strip_picklist_options(products, job=None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                           throttle_seconds: float = DEFAULT_THROTTLE_SECONDS) -> Dict[str, Any]:
+    """Remove duplicated picklist options from stored products, measuring collection size before and after"""
+    before = measure_collection_size(products)
+    if job:
+        job.report(before=before)
+    query = {'structure.attributes.options': {'$exists': True}}
+    finished, _ = apply_pipeline_in_chunks(products, query, STRIP_PICKLIST_OPTIONS_PIPELINE,
+                                           chunk_size=chunk_size, throttle_seconds=throttle_seconds, job=job)
+    after = measure_collection_size(products)
+    if job:
+        job.report(after=after)
+    return {
+        'status': 'completed' if finished else 'cancelled',
+        'before': before,
+        'after': after,
+        'bytes_saved': before['bytes'] - after['bytes']
+    }
+
+
+def typed_attributes(template: Dict[str, Any]) -> Dict[str, str]:
+    """Map attribute name to type for every attribute of a template stored as a native BSON value"""
+    return {attr['name']: attr['type']
+            for section in template.get('sections', [])
+            for attr in section.get('attributes', [])
+            if attr.get('type') in TYPED_ATTRIBUTE_TYPES}
+
+
+def build_typed_values_filter(template: Dict[str, Any]) -> Dict[str, Any]:
+    """Query matching products of a template that still hold a typed attribute as a string"""
+    return {
+        **owned_products_filter(template['_id'], bool(template.get('is_default'))),
+        'structure.attributes': {'$elemMatch': {
+            'name': {'$in': list(typed_attributes(template))},
+            'value': {'$type': 'string'}
+        }}
+    }
+
+
+def build_typed_values_pipeline(template: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Update pipeline converting string values of typed attributes to native BSON values
+
+    Values that do not parse are left as they are rather than nulled.
+    """
+    branches = [
+        {'case': {'$eq': ['$$attr.name', name]},
+         'then': {'$mergeObjects': ['$$attr', {'value': {'$ifNull': [
+             _convert_value('$$attr.value', {'to': attr_type}), '$$attr.value'
+         ]}}]}}
+        for name, attr_type in typed_attributes(template).items()
+    ]
+    return [{'$set': {
+        'structure': {'$map': {'input': '$structure', 'as': 'section', 'in': {
+            '$mergeObjects': ['$$section', {'attributes': {'$map': {
+                'input': '$$section.attributes', 'as': 'attr',
+                'in': {'$switch': {'branches': branches, 'default': '$$attr'}}
+            }}}]
+        }}},
+        'updated_at': '$$NOW'
+    }}]
+
+
+def backfill_typed_values(products, templates: List[Dict[str, Any]], job=None,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE,
+                          throttle_seconds: float = DEFAULT_THROTTLE_SECONDS) -> Dict[str, Any]:
+    """Convert string-stored Number/Boolean/Date values to native types, one template's products at a time
+
+    The filter only matches products that still hold strings, so a restarted run picks up where it stopped.
+    """
+    templates = [template for template in templates if typed_attributes(template)]
+    if job:
+        job.report(total=sum(products.count_documents(build_typed_values_filter(template))
+                             for template in templates))
+    converted = []
+    for template in templates:
+        finished, _ = apply_pipeline_in_chunks(products, build_typed_values_filter(template),
+                                               build_typed_values_pipeline(template),
+                                               chunk_size=chunk_size, throttle_seconds=throttle_seconds, job=job)
+        if not finished:
+            return {'status': 'cancelled', 'templates': converted}
+        converted.append(str(template['_id']))
+    return {'status': 'completed', 'templates': converted}
+
+
+class TemplateMigrator:
+    """Applies template diffs to existing products in _id-ordered chunks"""
+
+    def __init__(self, products, migrations, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 throttle_seconds: float = DEFAULT_THROTTLE_SECONDS):
+        self.products = products
+        self.migrations = migrations
+        self.chunk_size = chunk_size
+        self.throttle_seconds = throttle_seconds
+
+    def create(self, template_id: str, diff: Dict[str, Any], is_default: bool = False,
+               revision: int = 0) -> ObjectId:
+        """Record a pending migration for a template diff and return its id
+
+        `revision` is the template revision the diff produced; migrations of a template apply in that order.
+        Nothing is counted here: the job computes the total, so the request path never scans products.
+        """
+        now = datetime.utcnow()
+        result = self.migrations.insert_one({
+            'template_id': template_id,
+            'is_default': is_default,
+            'revision': revision,
+            'diff': diff,
+            'status': 'pending',
+            'last_id': None,
+            'total': None,
+            'processed': 0,
+            'modified': 0,
+            'chunks': 0,
+            'error': None,
+            'created_at': now,
+            'updated_at': now
+        })
+        return result.inserted_id
+
+    def get(self, migration_id: ObjectId) -> Optional[Dict[str, Any]]:
+        return self.migrations.find_one({'_id': migration_id})
+
+    def blocking_migration(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The oldest earlier migration of the same template that has not completed, if any"""
+        return self.migrations.find_one(
+            {'template_id': record['template_id'], 'status': {'$ne': 'completed'},
+             'revision': {'$lt': record.get('revision', 0)}},
+            sort=[('revision', 1), ('_id', 1)]
+        )
+
+    def run_pending(self, template_id: str, job=None) -> Dict[str, Any]:
+        """Run a template's unfinished migrations oldest first, stopping at one that cannot run now
+
+        Each diff was computed against the template as the previous one left it, so they must apply in
+        revision order and never overlap, whichever worker process picks the job up. A job that finds the
+        oldest migration claimed by another job leaves it alone; that job drains the rest when it finishes.
+        """
+        migrations = []
+        while True:
+            record = self.migrations.find_one({'template_id': template_id, 'status': {'$ne': 'completed'}},
+                                              sort=[('revision', 1), ('_id', 1)])
+            if not record:
+                return {'status': 'completed', 'migrations': migrations}
+            claimed = self._claim(record, job)
+            if not claimed:
+                return {'status': 'waiting', 'blocked_by': str(record['_id']), 'migrations': migrations}
+            migrations.append(str(record['_id']))
+            result = self.run(claimed, job)
+            if result['status'] != 'completed':
+                return dict(result, migrations=migrations)
+
+    def _claim(self, record: Dict[str, Any], job=None) -> Optional[Dict[str, Any]]:
+        # Atomic, so a migration never runs under two jobs; a job re-queued after a crash takes back its own
+        job_id = job.job_id if job else None
+        claimable = [{'status': 'pending'}]
+        if job_id:
+            claimable.append({'status': 'running', 'job_id': job_id})
+        return self.migrations.find_one_and_update(
+            {'_id': record['_id'], '$or': claimable},
+            {'$set': {'status': 'running', 'job_id': job_id, 'updated_at': datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def run(self, record: Dict[str, Any], job=None) -> Dict[str, Any]:
+        """Run (or continue) a migration from its last checkpoint, reporting progress to an optional job"""
+        try:
+            return self._run(record, job)
+        except Exception as e:
+            self.migrations.update_one(
+                {'_id': record['_id']},
+                {'$set': {'status': 'failed', 'error': str(e), 'updated_at': datetime.utcnow()}}
+            )
+            raise
+
+    def _run(self, record: Dict[str, Any], job=None) -> Dict[str, Any]:
+        query = build_migration_filter(record['diff'], record['template_id'], record.get('is_default', False))
+        pipeline = build_migration_pipeline(record['diff'])
+        update = {'status': 'running', 'error': None, 'updated_at': datetime.utcnow()}
+        total = record.get('total')
+        if total is None:
+            total = update['total'] = self.products.count_documents(query)
+        self.migrations.update_one({'_id': record['_id']}, {'$set': update})
+        if job:
+            job.report(total=total)
+
+        def checkpoint(last_id, result):
+            self.migrations.update_one(
+                {'_id': record['_id']},
+                {
+                    '$set': {'last_id': last_id, 'updated_at': datetime.utcnow()},
+                    '$inc': {'processed': result.matched_count, 'modified': result.modified_count, 'chunks': 1}
+                }
+            )
+
+        finished, last_id = apply_pipeline_in_chunks(
+            self.products, query, pipeline,
+            chunk_size=self.chunk_size, throttle_seconds=self.throttle_seconds,
+            start_after=record.get('last_id'), job=job, on_chunk=checkpoint
+        )
+        if not finished:
+            self.migrations.update_one(
+                {'_id': record['_id']},
+                {'$set': {'status': 'cancelled', 'updated_at': datetime.utcnow()}}
+            )
+            return {'status': 'cancelled', 'last_id': str(last_id) if last_id else None}
+
+        self.migrations.update_one(
+            {'_id': record['_id']},
+            {'$set': {'status': 'completed', 'updated_at': datetime.utcnow(), 'completed_at': datetime.utcnow()}}
+        )
+        return {'status': 'completed'}
@@ -1,9 +1,13 @@
-from datetime import datetime
+import math
+from datetime import datetime, date
 from typing import List, Dict, Any, Optional, Union
 from copy import deepcopy
 
 class ProductAttribute:
     VALID_TYPES = {"String", "Number", "Boolean", "Date", "Text", "Rich Text", "Picklist"}
+    TRUE_STRINGS = {"true", "1", "yes"}
+    FALSE_STRINGS = {"false", "0", "no"}
+    INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
 
     def __init__(self, id: Union[int, str], name: str, type: str, required: bool = False, 
                  value: Any = None, options: Optional[List[str]] = None):
@@ -35,14 +39,17 @@ class ProductAttribute:
         if self.type == "String":
             return isinstance(value, str)
         elif self.type == "Number":
+            if isinstance(value, bool):
+                return False
             try:
-                float(value)
-                return True
-            except (ValueError, TypeError):
+                return math.isfinite(float(value))
+            except (ValueError, TypeError, OverflowError):
                 return False
         elif self.type == "Boolean":
             return isinstance(value, bool) or value is None
         elif self.type == "Date":
+            if isinstance(value, (datetime, date)):
+                return True
             try:
                 datetime.strptime(str(value), '%Y-%m-%d')
                 return True
@@ -54,6 +61,49 @@ class ProductAttribute:
             return isinstance(value, str) and (not self.options or value in self.options)
         return False
 
+    def coerce_value(self, value: Any) -> Any:
+        """Convert a submitted value to the native type stored for this attribute"""
+        if value is None or value == "":
+            return None
+        if self.type == "Number":
+            if isinstance(value, bool):
+                raise ValueError(f"Invalid value for attribute {self.name}: {value}")
+            number = value
+            if not isinstance(value, (int, float)):
+                text = str(value).strip()
+                try:
+                    number = int(text)
+                except ValueError:
+                    try:
+                        number = float(text)
+                    except ValueError:
+                        raise ValueError(f"Invalid value for attribute {self.name}: {value}")
+            # NaN/Infinity are not valid JSON, and BSON integers are at most 64-bit
+            if isinstance(number, float) and not math.isfinite(number):
+                raise ValueError(f"Invalid value for attribute {self.name}: {value}")
+            if isinstance(number, int) and not self.INT64_MIN <= number <= self.INT64_MAX:
+                raise ValueError(f"Value for attribute {self.name} is out of range: {value}")
+            return number
+        if self.type == "Boolean":
+            if isinstance(value, bool):
+                return value
+            text = str(value).strip().lower()
+            if text in self.TRUE_STRINGS:
+                return True
+            if text in self.FALSE_STRINGS:
+                return False
+            raise ValueError(f"Invalid value for attribute {self.name}: {value}")
+        if self.type == "Date":
+            if isinstance(value, datetime):
+                return value
+            if isinstance(value, date):
+                return datetime(value.year, value.month, value.day)
+            try:
+                return datetime.strptime(str(value)[:10], '%Y-%m-%d')
+            except ValueError:
+                raise ValueError(f"Invalid value for attribute {self.name}: {value}")
+        return value
+
     def add_option(self, option: str):
         if self.type == "Picklist" and option and option not in (self.options or []):
             self.options = self.options or []
@@ -181,10 +231,13 @@ class Product:
                             raise ValueError(f"Invalid value for attribute {new_attr['name']}: {new_attr.get('value')}")
                         if template_attr and template_attr.required and new_attr.get('value') is None:
                             raise ValueError(f"Attribute {new_attr['name']} is required")
+                        value = template_attr.coerce_value(new_attr.get('value')) if template_attr else new_attr.get('value')
+                    else:
+                        value = new_attr.get('value')
+                    # Picklist options are resolved from the view template, not copied into every product
                     section['attributes'].append({
                         'name': new_attr['name'],
-                        'value': new_attr.get('value'),
-                        'options': new_attr.get('options', [])
+                        'value': value
                     })
                 self.sections.append(section)
             self.sku = next((attr['value'] for section in self.sections for attr in section['attributes'] if attr['name'] == 'SKU'), None)
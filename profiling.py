@@ -0,0 +1,124 @@
+import cProfile
+import hmac
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, List, Any
+
+from flask import g, request
+
+PROFILE_HEADER = 'X-Profile-Token'
+_FILENAME = re.compile(r'^(\d+)ms_')
+
+
+class RequestProfiler:
+    """Opt-in cProfile of single requests, keeping pstats dumps of the slowest `keep` in `output_dir`
+
+    A request is profiled when it carries the configured token in the X-Profile-Token header,
+    or when it is picked by `sample_rate`. Dumps open with pstats, snakeviz or flameprof.
+    Only register it (init_app) when one of the two is configured; otherwise it adds no hooks at all.
+    """
+
+    def __init__(self, output_dir: str, token: Optional[str] = None, sample_rate: float = 0.0, keep: int = 20):
+        self.output_dir = output_dir
+        self.token = token
+        self.sample_rate = sample_rate
+        self.keep = keep
+        # cProfile allows one active profiler per process on newer Pythons, so profile one request at a time
+        self._active = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._profiled = 0
+        self._skipped_busy = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._abandon)
+
+    def wanted(self) -> bool:
+        """Whether the current request asked for (or was sampled into) profiling"""
+        supplied = request.headers.get(PROFILE_HEADER)
+        if self.token and supplied and hmac.compare_digest(supplied, self.token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def profiles(self) -> List[Dict[str, Any]]:
+        """Kept profiles, slowest first"""
+        kept = []
+        for filename in os.listdir(self.output_dir):
+            match = _FILENAME.match(filename)
+            if match and filename.endswith('.prof'):
+                kept.append({'file': filename, 'duration_ms': int(match.group(1))})
+        kept.sort(key=lambda profile: profile['duration_ms'], reverse=True)
+        return kept
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            profiled, skipped_busy = self._profiled, self._skipped_busy
+        kept = self.profiles()
+        return {
+            'enabled': True,
+            'sample_rate': self.sample_rate,
+            'token_enabled': bool(self.token),
+            'profiled': profiled,
+            'skipped_busy': skipped_busy,
+            'output_dir': self.output_dir,
+            'kept': kept[:self.keep]
+        }
+
+    def _start(self):
+        if not self.wanted():
+            return
+        if not self._active.acquire(blocking=False):
+            with self._stats_lock:
+                self._skipped_busy += 1
+            return
+        profiler = cProfile.Profile()
+        g.request_profile = (profiler, time.perf_counter())
+        profiler.enable()
+
+    def _finish(self, response):
+        profile = g.pop('request_profile', None)
+        if profile is None:
+            return response
+        profiler, started = profile
+        profiler.disable()
+        self._active.release()
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        filename = self._save(profiler, duration_ms)
+        if filename:
+            response.headers['X-Profile-File'] = filename
+        return response
+
+    def _abandon(self, exc=None):
+        # after_request is skipped on unhandled errors; never leave the profiler running
+        profile = g.pop('request_profile', None)
+        if profile is not None:
+            profile[0].disable()
+            self._active.release()
+
+    def _save(self, profiler: cProfile.Profile, duration_ms: int) -> Optional[str]:
+        with self._stats_lock:
+            self._profiled += 1
+        kept = self.profiles()
+        if len(kept) >= self.keep and duration_ms <= kept[self.keep - 1]['duration_ms']:
+            return None
+
+        route = re.sub(r'[^A-Za-z0-9]+', '-', request.endpoint or 'unknown').strip('-')
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+        filename = f"{duration_ms:08d}ms_{route}_{request.method}_{stamp}.prof"
+        path = os.path.join(self.output_dir, filename)
+        profiler.dump_stats(path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+        for profile in self.profiles()[self.keep:]:
+            try:
+                os.remove(os.path.join(self.output_dir, profile['file']))
+            except FileNotFoundError:
+                # Another worker pruned it first
+                pass
+        return filename
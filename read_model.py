@@ -0,0 +1,162 @@
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Callable
+
+from pymongo.errors import PyMongoError
+
+from sync import SAFETY_LAG, CheckpointExpired, checkpoint_at, get_changes
+
+
+class CatalogSnapshot:
+    """Immutable, pre-serialized view of products and templates; refreshes build a new snapshot"""
+
+    def __init__(self, products: Dict[str, bytes], templates: Dict[str, bytes], checkpoint: str,
+                 products_json: Optional[bytes] = None):
+        self.products = products
+        self.templates = templates
+        self.checkpoint = checkpoint
+        self.products_json = products_json if products_json is not None else b'[' + b','.join(products.values()) + b']'
+        self.templates_json = b'[' + b','.join(templates.values()) + b']'
+        self.created_at = time.monotonic()
+
+    def memory_bytes(self) -> int:
+        """Approximate payload bytes held by this snapshot (serialized bodies, list bodies and keys)"""
+        payload = sum(len(body) for body in self.products.values()) + sum(len(body) for body in self.templates.values())
+        keys = 24 * (len(self.products) + len(self.templates))
+        return payload + keys + len(self.products_json) + len(self.templates_json)
+
+
+class ReadModel:
+    """Per-worker in-memory catalog for GET endpoints, kept current from updated_at deltas and tombstones"""
+
+    def __init__(self, products, view_templates, tombstones,
+                 serialize_product: Callable[[Dict[str, Any]], bytes],
+                 serialize_template: Callable[[Dict[str, Any]], bytes],
+                 projection: Optional[Dict[str, Any]] = None,
+                 refresh_interval_seconds: float = 5.0, max_staleness_seconds: float = 30.0,
+                 on_templates_changed: Optional[Callable[[], None]] = None):
+        self.products = products
+        self.view_templates = view_templates
+        self.tombstones = tombstones
+        self.serialize_product = serialize_product
+        self.serialize_template = serialize_template
+        self.projection = projection
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.max_staleness_seconds = max_staleness_seconds
+        # Called before product bodies are rebuilt for a template change, so caches the serializer
+        # reads templates from (e.g. a TTL cache) cannot hand back the old version
+        self.on_templates_changed = on_templates_changed
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._refreshed_at: Optional[float] = None
+        self._last_error: Optional[str] = None
+        self._wake = threading.Event()
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._change_stream = False
+
+    def snapshot(self) -> Optional[CatalogSnapshot]:
+        """Current snapshot, or None while loading or when it is staler than the bound (callers use Mongo)"""
+        if not self._started:
+            self.start()
+        if self._snapshot is None or time.monotonic() - self._refreshed_at > self.max_staleness_seconds:
+            return None
+        return self._snapshot
+
+    def start(self):
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._refresh_loop, name='read-model-refresh', daemon=True).start()
+        threading.Thread(target=self._watch_changes, name='read-model-watch', daemon=True).start()
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            'enabled': True,
+            'loaded': snapshot is not None,
+            'change_stream': self._change_stream,
+            'staleness_seconds': round(time.monotonic() - self._refreshed_at, 2) if self._refreshed_at else None,
+            'max_staleness_seconds': self.max_staleness_seconds,
+            'products': len(snapshot.products) if snapshot else 0,
+            'templates': len(snapshot.templates) if snapshot else 0,
+            'memory_bytes': snapshot.memory_bytes() if snapshot else 0,
+            'last_error': self._last_error
+        }
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                if self._snapshot is None:
+                    self._load()
+                else:
+                    try:
+                        self._apply_changes()
+                    except CheckpointExpired:
+                        self._load()
+                self._refreshed_at = time.monotonic()
+                self._last_error = None
+            except Exception as e:
+                # Keep serving the last snapshot until it passes the staleness bound
+                self._last_error = str(e)
+            self._wake.wait(self.refresh_interval_seconds)
+            self._wake.clear()
+
+    def _load(self):
+        # Start the delta checkpoint before the scan so writes made during it are replayed afterwards
+        started = datetime.utcnow() - SAFETY_LAG
+        products = {}
+        for product in self.products.find({}, self.projection, batch_size=1000).sort('_id', 1):
+            products[str(product['_id'])] = self.serialize_product(product)
+        self._snapshot = CatalogSnapshot(products, self._load_templates(), checkpoint_at(started))
+
+    def _load_templates(self) -> Dict[str, bytes]:
+        return {str(template['_id']): self.serialize_template(template)
+                for template in self.view_templates.find().sort('_id', 1)}
+
+    def _apply_changes(self):
+        snapshot = self._snapshot
+        templates = self._load_templates()
+        if templates != snapshot.templates:
+            # Product bodies embed picklist options resolved from templates, so rebuild them all
+            if self.on_templates_changed:
+                self.on_templates_changed()
+            self._load()
+            return
+
+        checkpoint = snapshot.checkpoint
+        changed: Dict[str, bytes] = {}
+        deleted: List[str] = []
+        while True:
+            changes = get_changes(self.products, self.tombstones, checkpoint, limit=1000,
+                                  projection=self.projection)
+            for product in changes['products']:
+                changed[str(product['_id'])] = self.serialize_product(product)
+            deleted += [tombstone['id'] for tombstone in changes['deleted'] if tombstone['collection'] == 'products']
+            checkpoint = changes['checkpoint']
+            if not changes['has_more']:
+                break
+
+        if not changed and not deleted:
+            self._snapshot = CatalogSnapshot(snapshot.products, templates, checkpoint,
+                                             products_json=snapshot.products_json)
+            return
+        products = dict(snapshot.products)
+        products.update(changed)
+        for product_id in deleted:
+            products.pop(product_id, None)
+        self._snapshot = CatalogSnapshot(products, templates, checkpoint)
+
+    def _watch_changes(self):
+        """Wake the refresher on every change when a change stream is available (replica sets only)"""
+        try:
+            with self.products.database.watch(
+                    [{'$match': {'ns.coll': {'$in': [self.products.name, self.view_templates.name]}}}]) as stream:
+                self._change_stream = True
+                for _ in stream:
+                    self._wake.set()
+        except PyMongoError:
+            # Standalone servers have no change streams; polling on refresh_interval_seconds covers it
+            self._change_stream = False
+
@@ -0,0 +1,47 @@
+from typing import Dict, List, Any
+
+
+def compile_merge_plan(template: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Precompute section order and attribute metadata for rendering products through a template"""
+    plan = []
+    for section in sorted(template.get('sections', []), key=lambda s: s.get('order', 0)):
+        attributes = []
+        for attr in section.get('attributes', []):
+            meta = {
+                'id': str(attr['id']) if attr.get('id') is not None else None,
+                'name': attr['name'],
+                'type': attr.get('type'),
+                'required': attr.get('required', False)
+            }
+            if attr.get('type') == 'Picklist':
+                meta['options'] = attr.get('options') or []
+            attributes.append(meta)
+        plan.append({
+            'id': section.get('id'),
+            'title': section.get('title'),
+            'order': section.get('order', 0),
+            'attributes': attributes
+        })
+    return plan
+
+
+def render_product(plan: List[Dict[str, Any]], product: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a product by a compiled merge plan in one pass over its attributes"""
+    values = {}
+    for section in product.get('structure', []):
+        for attr in section.get('attributes', []):
+            values.setdefault(attr.get('name'), attr.get('value'))
+
+    return {
+        '_id': str(product['_id']),
+        'name': product.get('name'),
+        'sections': [
+            {
+                'id': section['id'],
+                'title': section['title'],
+                'order': section['order'],
+                'attributes': [dict(meta, value=values.get(meta['name'])) for meta in section['attributes']]
+            }
+            for section in plan
+        ]
+    }
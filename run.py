@@ -1,4 +1,4 @@
-from app import app
+from app import app, job_runner
 from database import db_manager
 from seed_data import seed_sample_data
 
@@ -7,6 +7,10 @@ if __name__ == '__main__':
         seed_sample_data()
         print("Database initialized successfully")
 
+        # Re-queue or fail background jobs interrupted by a previous shutdown, and keep sweeping for
+        # jobs orphaned later (a crashed worker's heartbeat only goes stale after JOB_STALE_SECONDS)
+        job_runner.start()
+
         print("Starting Flask application...")
         app.run(debug=True, host='0.0.0.0', port=5000, use_reloader=False)
 
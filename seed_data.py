@@ -4,32 +4,34 @@ from datetime import datetime
 def seed_sample_data():
     """Seed the database with sample product data and view templates"""
     
-    # Sample product data with section-based structure
+    # Sample product data with section-based structure (picklist options come from the view template)
     sample_product = {
         "name": "Premium Auto Oil Filter Pro",
+        "sku": "AOF-PRO-2024-001",
+        "stock_quantity": 150,
         "structure": [
             {
                 "title": "Basic Information",
                 "attributes": [
                     {"name": "Product Name", "value": "Premium Auto Oil Filter Pro"},
                     {"name": "SKU", "value": "AOF-PRO-2024-001"},
-                    {"name": "Brand", "value": "Advance Auto Parts", "options": ["Advance Auto Parts", "Bosch", "K&N", "Fram", "Mobil 1", "Purolator", "WIX", "AC Delco"]},
-                    {"name": "Category", "value": "Automotive Filters", "options": ["Automotive Filters", "Engine Parts", "Maintenance Items", "Performance Parts", "OEM Parts"]},
-                    {"name": "Product Type", "value": "Oil Filter", "options": ["Oil Filter", "Air Filter", "Fuel Filter", "Cabin Filter", "Transmission Filter"]},
-                    {"name": "Status", "value": "Active", "options": ["Active", "Inactive", "Discontinued", "Coming Soon", "Out of Stock"]},
-                    {"name": "Launch Date", "value": "2024-01-15"},
+                    {"name": "Brand", "value": "Advance Auto Parts"},
+                    {"name": "Category", "value": "Automotive Filters"},
+                    {"name": "Product Type", "value": "Oil Filter"},
+                    {"name": "Status", "value": "Active"},
+                    {"name": "Launch Date", "value": datetime(2024, 1, 15)},
                     {"name": "Discontinue Date", "value": None}
                 ]
             },
             {
                 "title": "Pricing & Inventory",
                 "attributes": [
-                    {"name": "Cost Price", "value": "12.50"},
-                    {"name": "Selling Price", "value": "24.99"},
-                    {"name": "MSRP", "value": "29.99"},
-                    {"name": "Currency", "value": "USD", "options": ["USD", "EUR", "GBP", "CAD", "AUD"]},
-                    {"name": "Stock Quantity", "value": "150"},
-                    {"name": "Minimum Stock Level", "value": "25"},
+                    {"name": "Cost Price", "value": 12.5},
+                    {"name": "Selling Price", "value": 24.99},
+                    {"name": "MSRP", "value": 29.99},
+                    {"name": "Currency", "value": "USD"},
+                    {"name": "Stock Quantity", "value": 150},
+                    {"name": "Minimum Stock Level", "value": 25},
                     {"name": "Is Trackable", "value": True},
                     {"name": "Backorder Allowed", "value": None}
                 ]
@@ -37,13 +39,13 @@ def seed_sample_data():
             {
                 "title": "Physical Specifications",
                 "attributes": [
-                    {"name": "Weight (lbs)", "value": "0.8"},
-                    {"name": "Length (inches)", "value": "4.5"},
-                    {"name": "Width (inches)", "value": "3.2"},
-                    {"name": "Height (inches)", "value": "3.2"},
-                    {"name": "Color", "value": "Black", "options": ["Black", "White", "Silver", "Blue", "Red", "Yellow", "Green"]},
-                    {"name": "Material", "value": "Metal", "options": ["Metal", "Plastic", "Composite", "Rubber", "Synthetic", "Paper"]},
-                    {"name": "Package Type", "value": "Retail Box", "options": ["Retail Box", "Bulk Pack", "Blister Pack", "Poly Bag", "Custom Packaging"]}
+                    {"name": "Weight (lbs)", "value": 0.8},
+                    {"name": "Length (inches)", "value": 4.5},
+                    {"name": "Width (inches)", "value": 3.2},
+                    {"name": "Height (inches)", "value": 3.2},
+                    {"name": "Color", "value": "Black"},
+                    {"name": "Material", "value": "Metal"},
+                    {"name": "Package Type", "value": "Retail Box"}
                 ]
             },
             {
@@ -70,8 +72,8 @@ def seed_sample_data():
             {
                 "title": "Warranty & Support",
                 "attributes": [
-                    {"name": "Warranty Period (months)", "value": "12"},
-                    {"name": "Warranty Type", "value": "Limited", "options": ["Limited", "Full", "Extended", "Lifetime", "No Warranty"]},
+                    {"name": "Warranty Period (months)", "value": 12},
+                    {"name": "Warranty Type", "value": "Limited"},
                     {"name": "Warranty Coverage", "value": "Covers manufacturing defects and material failures under normal use conditions."},
                     {"name": "Support Contact", "value": "support@advanceautoparts.com"},
                     {"name": "Return Policy", "value": "30-day return policy for unused products in original packaging."}
@@ -0,0 +1,76 @@
+import threading
+from functools import wraps
+from typing import Dict, Any, Callable, Hashable, Tuple
+
+from flask import current_app, make_response, request
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent identical calls into one execution whose result is shared by every caller"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._requests = 0
+        self._executions = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run fn for key, or wait for the in-flight run with the same key; returns (result, shared)"""
+        with self._lock:
+            self._requests += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._executions += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def coalesce(self, view: Callable) -> Callable:
+        """Decorate a Flask GET view so concurrent identical requests share one response body"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.endpoint, tuple(sorted(kwargs.items())), tuple(sorted(request.args.items(multi=True))))
+            (body, status, headers), _ = self.do(key, lambda: _freeze(view(*args, **kwargs)))
+            return current_app.response_class(body, status=status, headers=headers)
+        return wrapper
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            coalesced = self._requests - self._executions
+            return {
+                'requests': self._requests,
+                'executions': self._executions,
+                'coalesced': coalesced,
+                'coalescing_ratio': coalesced / self._requests if self._requests else 0.0,
+                'in_flight': len(self._calls)
+            }
+
+
+def _freeze(rv) -> Tuple[bytes, int, list]:
+    """Turn a view's return value into immutable parts that every waiting request can reuse"""
+    response = make_response(rv)
+    headers = [(name, value) for name, value in response.headers.items() if name.lower() != 'content-length']
+    return response.get_data(), response.status_code, headers
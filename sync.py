@@ -0,0 +1,111 @@
+import base64
+import json
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Any, Tuple
+
+from bson import ObjectId
+
+DEFAULT_RETENTION_DAYS = 30
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+# Writes stamp updated_at before they commit, so the newest few seconds are held back
+# until in-flight writes with slightly older timestamps have landed
+SAFETY_LAG = timedelta(seconds=2)
+
+_EPOCH = datetime(1970, 1, 1)
+_MIN_ID = ObjectId('0' * 24)
+_MAX_ID = ObjectId('f' * 24)
+
+
+class CheckpointExpired(Exception):
+    """Raised when a checkpoint is older than the tombstone retention window"""
+
+
+def _to_millis(value: datetime) -> int:
+    return int((value - _EPOCH).total_seconds() * 1000)
+
+
+def _from_millis(value: int) -> datetime:
+    return _EPOCH + timedelta(milliseconds=value)
+
+
+def encode_checkpoint(products_pos: Tuple[datetime, ObjectId], deleted_pos: Tuple[datetime, ObjectId]) -> str:
+    payload = {
+        'p': [_to_millis(products_pos[0]), str(products_pos[1])],
+        'd': [_to_millis(deleted_pos[0]), str(deleted_pos[1])]
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+
+def checkpoint_at(moment: datetime) -> str:
+    """Checkpoint that replays every change made after the given moment"""
+    return encode_checkpoint((moment, _MIN_ID), (moment, _MIN_ID))
+
+
+def decode_checkpoint(token: str) -> Tuple[Tuple[datetime, ObjectId], Tuple[datetime, ObjectId]]:
+    """Parse a checkpoint token, raising ValueError if it is malformed"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return ((_from_millis(payload['p'][0]), ObjectId(payload['p'][1])),
+                (_from_millis(payload['d'][0]), ObjectId(payload['d'][1])))
+    except Exception:
+        raise ValueError("Invalid checkpoint token")
+
+
+def record_tombstone(tombstones, collection: str, doc_id: str):
+    """Remember a deletion so delta-sync clients can drop the document"""
+    tombstones.insert_one({'collection': collection, 'doc_id': str(doc_id), 'deleted_at': datetime.utcnow()})
+
+
+def _after(field: str, position: Tuple[datetime, ObjectId]) -> Dict[str, Any]:
+    return {'$or': [{field: {'$gt': position[0]}}, {field: position[0], '_id': {'$gt': position[1]}}]}
+
+
+def get_changes(products, tombstones, token: Optional[str], limit: int = DEFAULT_PAGE_SIZE,
+                retention_days: int = DEFAULT_RETENTION_DAYS,
+                projection: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Return products changed and deleted since a checkpoint, plus the next checkpoint
+
+    Without a token this is a paged full sync; deletions before it are irrelevant to the client.
+    View templates are not part of the feed: clients refetch them from the template routes.
+    """
+    now = datetime.utcnow()
+    horizon = now - SAFETY_LAG
+    if token:
+        products_pos, deleted_pos = decode_checkpoint(token)
+        if deleted_pos[0] < now - timedelta(days=retention_days):
+            raise CheckpointExpired("Checkpoint is older than the tombstone retention window; full resync required")
+        product_query = {'$and': [_after('updated_at', products_pos), {'updated_at': {'$lte': horizon}}]}
+    else:
+        products_pos = (_EPOCH, _MIN_ID)
+        deleted_pos = (horizon, _MAX_ID)
+        product_query = {'updated_at': {'$lte': horizon}}
+
+    changed = list(products.find(product_query, projection).sort([('updated_at', 1), ('_id', 1)]).limit(limit + 1))
+    has_more = len(changed) > limit
+    changed = changed[:limit]
+    if changed:
+        products_pos = (changed[-1]['updated_at'], changed[-1]['_id'])
+
+    deleted: List[Dict[str, Any]] = []
+    if token:
+        deleted_query = {'$and': [{'collection': 'products'}, _after('deleted_at', deleted_pos),
+                                  {'deleted_at': {'$lte': horizon}}]}
+        deleted = list(tombstones.find(deleted_query).sort([('deleted_at', 1), ('_id', 1)]).limit(limit + 1))
+        more_deleted = len(deleted) > limit
+        has_more = has_more or more_deleted
+        deleted = deleted[:limit]
+        if deleted:
+            deleted_pos = (deleted[-1]['deleted_at'], deleted[-1]['_id'])
+        if not more_deleted:
+            # Caught up on deletions; advancing to the horizon keeps idle clients inside the retention window
+            deleted_pos = (horizon, _MAX_ID)
+
+    return {
+        'products': changed,
+        'deleted': [{'collection': tombstone['collection'], 'id': tombstone['doc_id'],
+                     'deleted_at': tombstone['deleted_at']} for tombstone in deleted],
+        'checkpoint': encode_checkpoint(products_pos, deleted_pos),
+        'has_more': has_more
+    }
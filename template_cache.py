@@ -0,0 +1,133 @@
+import threading
+import time
+from typing import Optional, Dict, List, Any, Callable
+
+from bson import ObjectId
+
+from models import ProductAttribute
+
+MAX_ENTRIES = 1000
+
+
+class TemplateCache:
+    """Read-through cache of view template documents and values derived from them
+
+    Cached documents are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, view_templates, ttl_seconds: float = 30.0):
+        self.view_templates = view_templates
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._templates: Dict[str, Any] = {}
+        self._derived: Dict[Any, Any] = {}
+        self._default_id: Optional[str] = None
+        self._default_loaded_at = 0.0
+
+    def get(self, template_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return a template by id, falling back to the default template when the id is missing, invalid or unknown"""
+        return (self.find(template_id) if template_id else None) or self.default()
+
+    def find(self, template_id: str) -> Optional[Dict[str, Any]]:
+        """Return a template by id, or None when the id is invalid or no such template exists
+
+        Misses are cached like hits, so products pointing at a deleted template do not each cost a query.
+        """
+        template_id = str(template_id)
+        if not ObjectId.is_valid(template_id):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._templates.get(template_id)
+            if entry and now - entry[1] < self.ttl_seconds:
+                return entry[0]
+
+        template = self.view_templates.find_one({'_id': ObjectId(template_id)})
+        with self._lock:
+            self._store(template_id, template, now)
+        return template
+
+    def default(self) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            if self._default_id and now - self._default_loaded_at < self.ttl_seconds:
+                entry = self._templates.get(self._default_id)
+                if entry and now - entry[1] < self.ttl_seconds:
+                    return entry[0]
+
+        template = self.view_templates.find_one({'is_default': True})
+        if not template:
+            return None
+        with self._lock:
+            self._default_id = str(template['_id'])
+            self._default_loaded_at = now
+            self._store(self._default_id, template, now)
+        return template
+
+    def for_product(self, product: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the template owning a product (its view_template_id, else the default template)"""
+        return self.get(product.get('view_template_id'))
+
+    def derived(self, template: Dict[str, Any], key: str, builder: Callable[[Dict[str, Any]], Any]) -> Any:
+        """Memoize a value computed from a template until the template is reloaded or invalidated"""
+        cache_key = (str(template['_id']), key)
+        with self._lock:
+            entry = self._derived.get(cache_key)
+            if entry and entry[0] is template:
+                return entry[1]
+        value = builder(template)
+        with self._lock:
+            self._derived[cache_key] = (template, value)
+        return value
+
+    def picklist_options(self, template: Optional[Dict[str, Any]]) -> Dict[str, List[str]]:
+        """Map attribute name to its options for every Picklist attribute in a template"""
+        if not template:
+            return {}
+        return self.derived(template, 'picklist_options', _build_picklist_options)
+
+    def attribute_types(self, template: Optional[Dict[str, Any]]) -> Dict[str, ProductAttribute]:
+        """Map attribute name to a ProductAttribute for coercing submitted values to their stored type"""
+        if not template:
+            return {}
+        return self.derived(template, 'attribute_types', _build_attribute_types)
+
+    def invalidate(self, template_id: Optional[str] = None):
+        """Drop one template (or everything) after a write so the next read reloads it"""
+        with self._lock:
+            if template_id is None:
+                self._templates.clear()
+                self._derived.clear()
+                self._default_id = None
+                return
+            template_id = str(template_id)
+            self._templates.pop(template_id, None)
+            self._derived = {key: value for key, value in self._derived.items() if key[0] != template_id}
+            if self._default_id == template_id:
+                self._default_id = None
+
+    def _store(self, template_id: str, template: Optional[Dict[str, Any]], loaded_at: float):
+        # None is kept too, as a cached miss; ids come from requests, so expired entries must not pile up
+        if len(self._templates) >= MAX_ENTRIES:
+            self._templates = {key: entry for key, entry in self._templates.items()
+                               if loaded_at - entry[1] < self.ttl_seconds}
+        self._templates[template_id] = (template, loaded_at)
+
+
+def _build_picklist_options(template: Dict[str, Any]) -> Dict[str, List[str]]:
+    options = {}
+    for section in template.get('sections', []):
+        for attr in section.get('attributes', []):
+            if attr.get('type') == 'Picklist':
+                options[attr['name']] = attr.get('options') or []
+    return options
+
+
+def _build_attribute_types(template: Dict[str, Any]) -> Dict[str, ProductAttribute]:
+    attributes = {}
+    for section in template.get('sections', []):
+        for attr in section.get('attributes', []):
+            if attr.get('type') in ProductAttribute.VALID_TYPES:
+                attributes[attr['name']] = ProductAttribute(attr.get('id', attr['name']), attr['name'], attr['type'],
+                                                            options=attr.get('options'))
+    return attributes
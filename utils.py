@@ -1,6 +1,18 @@
 from bson import ObjectId
 from datetime import datetime
+from pymongo import ReturnDocument
 import re
+import string
+import threading
+
+# Bookkeeping fields kept on product documents (dedupe signatures, applied stock batch ids) that are
+# never part of a product response; several of them hold ObjectIds and are not JSON serializable
+INTERNAL_FIELDS_PROJECTION = {
+    'dedupe_signature': 0,
+    'dedupe_bands': 0,
+    'recent_inventory_batches': 0,
+    'last_inventory_batch': 0
+}
 
 def serialize_doc(doc):
     """Convert MongoDB document to JSON serializable format"""
@@ -27,6 +39,97 @@ def serialize_doc(doc):
     
     return doc
 
+def get_attribute_value(structure, name, default=None):
+    """Return the value of the first attribute with the given name in a product structure"""
+    for section in structure or []:
+        for attr in section.get('attributes', []):
+            if attr.get('name') == name:
+                return attr.get('value')
+    return default
+
+def normalize_text(text):
+    """Lowercase text and collapse everything but letters and digits to single spaces"""
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text.lower()).split())
+
+def without_picklist_options(structure):
+    """Return a product structure with embedded picklist options removed (options live on the template)"""
+    return [
+        dict(section, attributes=[
+            {key: value for key, value in attr.items() if key != 'options'}
+            for attr in section.get('attributes', [])
+        ])
+        for section in structure or []
+    ]
+
+def with_picklist_options(structure, options_by_name):
+    """Return a product structure with picklist options resolved from the owning template"""
+    if not options_by_name:
+        return structure
+    return [
+        dict(section, attributes=[
+            dict(attr, options=options_by_name[attr.get('name')]) if attr.get('name') in options_by_name else attr
+            for attr in section.get('attributes', [])
+        ])
+        for section in structure or []
+    ]
+
+def coerce_structure_values(structure, attributes):
+    """Return a product structure with values converted to the native types of their template attributes
+
+    `attributes` maps attribute name to a ProductAttribute; raises ValueError listing every value that does not fit.
+    """
+    errors = []
+    coerced = []
+    for section in structure or []:
+        section_attributes = []
+        for attr in section.get('attributes', []):
+            template_attr = attributes.get(attr.get('name'))
+            if template_attr is not None and 'value' in attr:
+                try:
+                    attr = dict(attr, value=template_attr.coerce_value(attr['value']))
+                except ValueError as e:
+                    errors.append(str(e))
+            section_attributes.append(attr)
+        coerced.append(dict(section, attributes=section_attributes))
+    if errors:
+        raise ValueError('; '.join(errors))
+    return coerced
+
+def format_attribute_value(value, legacy=False):
+    """Format a stored attribute value for JSON: dates as YYYY-MM-DD, and numbers as strings for legacy clients"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    if legacy and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+def present_structure_values(structure, legacy=False):
+    """Return a product structure with every attribute value formatted by format_attribute_value"""
+    return [
+        dict(section, attributes=[
+            dict(attr, value=format_attribute_value(attr['value'], legacy)) if 'value' in attr else attr
+            for attr in section.get('attributes', [])
+        ])
+        for section in structure or []
+    ]
+
+def parse_stock_quantity(value):
+    """Return a stock quantity as a non-negative int, raising ValueError for anything else
+
+    Whole floats (7.0) are accepted; fractional ones are rejected rather than truncated.
+    """
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("Stock quantity must be a valid integer")
+    try:
+        stock = int(value)
+    except ValueError:
+        raise ValueError("Stock quantity must be a valid integer")
+    if stock < 0:
+        raise ValueError("Stock quantity must be non-negative")
+    return stock
+
 def validate_product_data(data):
     """Validate product data before saving"""
     errors = []
@@ -55,11 +158,9 @@ def validate_product_data(data):
     # Stock quantity validation
     if 'stock_quantity' in data:
         try:
-            stock = int(data['stock_quantity'])
-            if stock < 0:
-                errors.append("Stock quantity must be non-negative")
-        except (ValueError, TypeError):
-            errors.append("Stock quantity must be a valid integer")
+            parse_stock_quantity(data['stock_quantity'])
+        except ValueError as e:
+            errors.append(str(e))
     
     return errors
 
@@ -131,16 +232,63 @@ def build_search_query(search_params):
     
     return query
 
-def generate_sku():
-    """Generate a unique SKU"""
-    import random
-    import string
-    
-    # Generate random alphanumeric string
-    random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-    timestamp_part = datetime.now().strftime('%Y%m')
-    
-    return f"PRD-{timestamp_part}-{random_part}"
+SKU_ALPHABET = string.digits + string.ascii_uppercase
+
+class SkuAllocator:
+    """Hand out unique SKUs from blocks of sequence numbers reserved atomically in a counters collection"""
+
+    def __init__(self, counters, block_size=1000, prefix='PRD', width=8):
+        self.counters = counters
+        self.block_size = block_size
+        self.prefix = prefix
+        self.width = width
+        self._lock = threading.Lock()
+        self._period = None
+        self._next = 0
+        self._end = 0
+
+    def next_sku(self):
+        """Return a single unique SKU"""
+        return self.allocate(1)[0]
+
+    def allocate(self, count):
+        """Return `count` unique SKUs, reserving at most one new block from the database"""
+        with self._lock:
+            period = datetime.now().strftime('%Y%m')
+            if period != self._period:
+                # Sequences restart every month, so drop whatever is left of last month's block
+                self._period = period
+                self._next = self._end = 0
+
+            skus = []
+            while len(skus) < count:
+                if self._next >= self._end:
+                    self._reserve(period, max(self.block_size, count - len(skus)))
+                take = min(count - len(skus), self._end - self._next)
+                skus.extend(self._format(period, seq) for seq in range(self._next, self._next + take))
+                self._next += take
+            return skus
+
+    def _reserve(self, period, size):
+        counter = self.counters.find_one_and_update(
+            {'_id': f"sku-{self.prefix}-{period}"},
+            {'$inc': {'seq': size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._end = counter['seq'] + 1
+        self._next = self._end - size
+
+    def _format(self, period, seq):
+        encoded = ''
+        while seq:
+            seq, remainder = divmod(seq, len(SKU_ALPHABET))
+            encoded = SKU_ALPHABET[remainder] + encoded
+        return f"{self.prefix}-{period}-{encoded.rjust(self.width, '0')}"
+
+def generate_sku(allocator):
+    """Generate a unique SKU from a SkuAllocator"""
+    return allocator.next_sku()
 
 def calculate_product_stats(products):
     """Calculate statistics for products"""